@@ -1,4 +1,5 @@
 from helpers.StrategyCoreResolver import StrategyCoreResolver
+from helpers.multicall import Batch, batch, resolve
 from rich.console import Console
 from brownie import interface
 from tabulate import tabulate
@@ -12,22 +13,32 @@ class StrategyResolver(StrategyCoreResolver):
         Track balances for all strategy implementations
         (Strategy Must Implement)
         """
-        strategy = self.manager.strategy
-        return {
-            "lpDepositor": strategy.lpDepositor(),
-            "router": strategy.router(),
-            "badgerTree": strategy.badgerTree(),
+        strategy = batch(self.manager.strategy)
+        with Batch():
+            destinations = {
+                "lpDepositor": strategy.lpDepositor(),
+                "router": strategy.router(),
+                "badgerTree": strategy.badgerTree(),
+            }
+        return resolve(destinations)
+
+    def prepare_snap(self):
+        super().prepare_snap()
+        strategy = batch(self.manager.strategy)
+
+        with Batch():
+            solidHelperVault = strategy.solidHelperVault()
+            sexHelperVault = strategy.sexHelperVault()
+        self.helperVaults = {
+            "solidHelperVault": interface.IERC20(solidHelperVault.value),
+            "sexHelperVault": interface.IERC20(sexHelperVault.value),
         }
 
     def add_balances_snap(self, calls, entities):
         super().add_balances_snap(calls, entities)
-        strategy = self.manager.strategy
 
-        solidHelperVault = interface.IERC20(strategy.solidHelperVault())
-        sexHelperVault = interface.IERC20(strategy.sexHelperVault())
-
-        calls = self.add_entity_balances_for_tokens(calls, "solidHelperVault", solidHelperVault, entities)
-        calls = self.add_entity_balances_for_tokens(calls, "sexHelperVault", sexHelperVault, entities)
+        for tokenKey, token in self.helperVaults.items():
+            calls = self.add_entity_balances_for_tokens(calls, tokenKey, token, entities)
 
         return calls
 
@@ -0,0 +1,121 @@
+// SPDX-License-Identifier: MIT
+
+pragma solidity ^0.6.11;
+pragma experimental ABIEncoderV2;
+
+/// @notice Subset of Multicall3 (https://github.com/mds1/multicall) that compiles with 0.6
+/// @dev Never deployed. helpers.multicall injects its runtime bytecode through eth_call
+///      state overrides on chains without a known aggregator deployment.
+///      getBasefee() is left out as BASEFEE is not available before solc 0.8.7
+contract Multicall3 {
+    struct Call {
+        address target;
+        bytes callData;
+    }
+
+    struct Call3 {
+        address target;
+        bool allowFailure;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    function aggregate(Call[] calldata calls)
+        public
+        payable
+        returns (uint256 blockNumber, bytes[] memory returnData)
+    {
+        blockNumber = block.number;
+        returnData = new bytes[](calls.length);
+        for (uint256 i = 0; i < calls.length; i++) {
+            (bool success, bytes memory ret) = calls[i].target.call(
+                calls[i].callData
+            );
+            require(success, "Multicall3: call failed");
+            returnData[i] = ret;
+        }
+    }
+
+    function tryAggregate(bool requireSuccess, Call[] calldata calls)
+        public
+        payable
+        returns (Result[] memory returnData)
+    {
+        returnData = new Result[](calls.length);
+        for (uint256 i = 0; i < calls.length; i++) {
+            (bool success, bytes memory ret) = calls[i].target.call(
+                calls[i].callData
+            );
+            if (requireSuccess) {
+                require(success, "Multicall3: call failed");
+            }
+            returnData[i] = Result(success, ret);
+        }
+    }
+
+    function tryBlockAndAggregate(bool requireSuccess, Call[] calldata calls)
+        public
+        payable
+        returns (
+            uint256 blockNumber,
+            bytes32 blockHash,
+            Result[] memory returnData
+        )
+    {
+        blockNumber = block.number;
+        blockHash = blockhash(block.number);
+        returnData = tryAggregate(requireSuccess, calls);
+    }
+
+    function aggregate3(Call3[] calldata calls)
+        public
+        payable
+        returns (Result[] memory returnData)
+    {
+        returnData = new Result[](calls.length);
+        for (uint256 i = 0; i < calls.length; i++) {
+            (bool success, bytes memory ret) = calls[i].target.call(
+                calls[i].callData
+            );
+            require(
+                success || calls[i].allowFailure,
+                "Multicall3: call failed"
+            );
+            returnData[i] = Result(success, ret);
+        }
+    }
+
+    function getBlockHash(uint256 blockNumber)
+        public
+        view
+        returns (bytes32 blockHash)
+    {
+        blockHash = blockhash(blockNumber);
+    }
+
+    function getBlockNumber() public view returns (uint256 blockNumber) {
+        blockNumber = block.number;
+    }
+
+    function getCurrentBlockTimestamp()
+        public
+        view
+        returns (uint256 timestamp)
+    {
+        timestamp = block.timestamp;
+    }
+
+    function getEthBalance(address addr) public view returns (uint256 balance) {
+        balance = addr.balance;
+    }
+
+    function getChainId() public view returns (uint256 chainid) {
+        assembly {
+            chainid := chainid()
+        }
+    }
+}
@@ -1,75 +1,344 @@
+import json
+import os
+
 from brownie import *
 from tabulate import tabulate
 from rich.console import Console
-from helpers.multicall import Multicall
+from hexbytes import HexBytes
+from helpers.multicall import Batch, Multicall, batch
+from helpers.multicall.address import to_address
+from helpers.multicall.cache import is_pinned
+from helpers.multicall.plan import CallPlan
+from helpers.multicall.result import ColumnarResult
 from helpers.utils import val
 
+from helpers.snapshot.delta import FULL, VERIFY, derive, mismatches, snap_mode
+from helpers.snapshot.history import SnapHistory
 from helpers.snapshot.snap import Snap
+from helpers.snapshot.store import SnapStore
 
 from config.StrategyResolver import StrategyResolver
 
 console = Console()
 
+# Entities whose native FTM balance is part of every snap, when tracked
+NATIVE_BALANCE_ENTITIES = ["strategist", "keeper", "governance", "user"]
+
 
 class SnapshotManager:
-    def __init__(self, sett, strategy, controller, key):
+    def __init__(
+        self,
+        sett,
+        strategy,
+        controller,
+        key,
+        endpoints=None,
+        history=None,
+        store=None,
+    ):
         self.key = key
         self.sett = sett
         self.strategy = strategy
         self.controller = controller
-        self.want = interface.IERC20(self.sett.token())
-        self.resolver = self.init_resolver(self.strategy.getName())
-        self.snaps = {}
-        self.settSnaps = {}
+        with Batch():
+            token = batch(self.sett).token()
+            name = batch(self.strategy).getName()
+            strategyWant = batch(self.strategy).want()
+            governance = batch(self.strategy).governance()
+            governanceRewards = batch(self.controller).rewards()
+            strategist = batch(self.strategy).strategist()
+            keeper = batch(self.strategy).keeper()
+        self.want = interface.IERC20(token.value)
+        self.resolver = self.init_resolver(name.value)
+        # SnapHistory, by default with the retention policy of the environment
+        self.snaps = history if history is not None else SnapHistory.from_env()
+        self.settSnaps = SnapHistory(self.snaps.maxSnaps, self.snaps.maxAge)
+        # Optional SnapStore every snap is persisted to, see SNAP_STORE
+        self.store = store
+        if store is None and os.getenv("SNAP_STORE"):
+            self.store = SnapStore(os.getenv("SNAP_STORE"), key)
+        if self.store is not None and self.snaps.spill is None:
+            # Evicted snaps are in the store already
+            self.snaps.spill = self.store
+            self.snaps.persisted = True
         self.entities = {}
-
-        assert self.want == self.strategy.want()
+        # Compiled snap calls and the entities they were built for
+        self.plan = None
+        self.planEntities = {}
+        self.nativeEntities = set(NATIVE_BALANCE_ENTITIES)
+        # Optional EndpointPool for the snap reads
+        self.endpoints = endpoints
+        # How the sett actions take their after-snaps, see helpers/snapshot/delta.py
+        self.snapMode = snap_mode(os.getenv("SNAP_MODE", FULL))
+        # (key, snap) of the latest snap at the chain head, see latest. State
+        # changed without mining a block, e.g. by setting a balance through
+        # the node, needs a reset to None
+        self.latestSnap = None
+        self.coalesce = True
+
+        assert self.want == strategyWant.value
 
         # Common entities for all strategies
         self.addEntity("sett", self.sett.address)
         self.addEntity("strategy", self.strategy.address)
         self.addEntity("controller", self.controller.address)
-        self.addEntity("governance", self.strategy.governance())
-        self.addEntity("governanceRewards", self.controller.rewards())
-        self.addEntity("strategist", self.strategy.strategist())
+        self.addEntity("governance", governance.value)
+        self.addEntity("governanceRewards", governanceRewards.value)
+        self.addEntity("strategist", strategist.value)
+        self.addEntity("keeper", keeper.value)
 
         destinations = self.resolver.get_strategy_destinations()
         for key, dest in destinations.items():
             self.addEntity(key, dest)
 
-    def add_snap_calls(self, entities):
-        calls = []
-        calls = self.resolver.add_balances_snap(calls, entities)
-        calls = self.resolver.add_sett_snap(calls)
-        # calls = self.resolver.add_sett_permissions_snap(calls)
-        calls = self.resolver.add_strategy_snap(calls, entities=entities)
-        return calls
-
-    def snap(self, trackedUsers=None):
+    def snap(self, trackedUsers=None, block_identifier=None):
         print("snap")
-        snapBlock = chain.height
+        head = None
+        if block_identifier is None and self.coalesce:
+            head = self.head()
+            snap = self.latest(head, trackedUsers)
+            if snap is not None:
+                return snap
+            # Pinned, so the snap is labelled with the node's head
+            block_identifier = head[0]
+        multi = self.snap_multicall(trackedUsers, block_identifier)
+        data = multi()
+        snap = self.record_snap(multi, data)
+        if head is not None:
+            self.cacheLatest(head, trackedUsers, snap)
+        return snap
+
+    def head(self):
+        """
+        (number, hash) of the latest block
+        """
+        if self.endpoints:
+            block = self.endpoints.request("eth_getBlockByNumber", ["latest", False])
+            return int(block["number"], 16), bytes.hex(HexBytes(block["hash"]))
+        block = web3.eth.get_block("latest")
+        return block["number"], bytes.hex(HexBytes(block["hash"]))
+
+    def minedHead(self, tx):
+        """
+        (number, hash) of the block tx was mined in, None when tx logged
+        nothing. Taken from the logs, so after-snaps are cached without a
+        head lookup
+        """
+        for log in tx.logs:
+            return tx.block_number, bytes.hex(HexBytes(log["blockHash"]))
+        return None
+
+    def snapKey(self, head, trackedUsers):
+        entities = dict(self.entities)
+        for key, user in (trackedUsers or {}).items():
+            entities[key] = to_address(user)
+        return (
+            head,
+            tuple(sorted(entities.items())),
+            tuple(sorted(self.nativeEntities)),
+        )
+
+    def latest(self, head, trackedUsers):
+        """
+        The latest snap when it was taken at head for the same entities,
+        nothing having been mined since
+        """
+        if self.latestSnap is None:
+            return None
+        key, snap = self.latestSnap
+        if key != self.snapKey(head, trackedUsers):
+            return None
+        return snap
+
+    def cacheLatest(self, head, trackedUsers, snap):
+        # snap was read pinned at head[0]
+        self.latestSnap = (self.snapKey(head, trackedUsers), snap)
+
+    def cacheAfter(self, tx, trackedUsers, snap):
+        head = self.minedHead(tx) if self.coalesce else None
+        if head is not None:
+            self.cacheLatest(head, trackedUsers, snap)
+
+    def snapAfter(self, before, tx, trackedUsers=None):
+        """
+        Snap of the block tx was mined in. Outside of FULL mode the ERC20
+        balances are derived from before and the Transfer logs of tx, and only
+        the other views are read. A full snap is taken instead when blocks were
+        mined between before and tx
+        """
+        if self.snapMode == FULL or before.block != tx.block_number - 1:
+            if self.snapMode != FULL:
+                console.print(
+                    "[yellow]Full after-snap: before-snap at block {}, tx at block {}[/yellow]".format(
+                        before.block, tx.block_number
+                    )
+                )
+            # A block was just mined, a cached snap can't be current
+            multi = self.snap_multicall(trackedUsers, tx.block_number)
+            snap = self.record_snap(multi, multi())
+            self.cacheAfter(tx, trackedUsers, snap)
+            return snap
+
+        planned = self.snap_multicall(trackedUsers, tx.block_number)
+        derived, reads = derive(before, planned.calls, tx.logs)
+        multi = Multicall(
+            reads,
+            block_identifier=tx.block_number,
+            allow_failure=True,
+            endpoints=self.endpoints,
+            columnar=True,
+        )
+        read = multi()
+        values = [
+            derived[key] if key in derived else read.get(key) for key in planned.keys
+        ]
+        snap = self.record_snap(
+            multi, ColumnarResult(planned.keys, values, planned.index)
+        )
+        self.cacheAfter(tx, trackedUsers, snap)
+
+        if self.snapMode == VERIFY:
+            full = self.snap_multicall(trackedUsers, tx.block_number)
+            wrong = mismatches(
+                snap, Snap(full(), tx.block_number, list(self.entities), full.missing)
+            )
+            assert not wrong, "Derived balances differ from a full read: {}".format(
+                wrong
+            )
+        return snap
+
+    async def asnap(self, trackedUsers=None, block_identifier=None):
+        """
+        Async version of snap, lets one event loop snapshot many setts concurrently
+        """
+        multi = self.snap_multicall(trackedUsers, block_identifier)
+        data = await multi.acall()
+        return self.record_snap(multi, data)
+
+    def snap_range(
+        self, start, end, step=1, trackedUsers=None, concurrency=None, checkpoint=None
+    ):
+        """
+        Snaps every step blocks from start to end (inclusive) against an archive
+        node, yielding each Snap as soon as it completes, in any block order.
+
+        Blocks already in self.snaps are skipped. With a checkpoint path, every
+        snap is also appended to that JSON lines file and the snaps found in it
+        are loaded first, so an interrupted sweep resumes where it stopped
+        """
+        if checkpoint and os.path.exists(checkpoint):
+            self.load_checkpoint(checkpoint)
+
+        blocks = [
+            block for block in range(start, end + 1, step) if block not in self.snaps
+        ]
+        multi = self.snap_multicall(trackedUsers, None)
+        for blockMulti, data in multi.over_blocks(blocks, concurrency):
+            snap = self.record_snap(blockMulti, data)
+            if checkpoint:
+                with open(checkpoint, "a") as f:
+                    f.write(json.dumps(snap.dump()) + "\n")
+            yield snap
+
+    def load_checkpoint(self, path):
+        line = ""
+        with open(path) as f:
+            for line in f:
+                # A sweep killed mid-write leaves a partial last line
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                self.snaps[item["block"]] = Snap.load(item, list(self.entities))
+        if line and not line.endswith("\n"):
+            # Terminate it so the next snap gets a line of its own
+            with open(path, "a") as f:
+                f.write("\n")
+
+    def snap_multicall(self, trackedUsers, block_identifier):
         entities = self.entities
 
         if trackedUsers:
             for key, user in trackedUsers.items():
-                entities[key] = user
+                entities[key] = to_address(user)
 
-        calls = self.add_snap_calls(entities)
+        plan = self.update_plan(entities)
 
-        multi = Multicall(calls)
+        multi = Multicall(
+            plan,
+            block_identifier=block_identifier,
+            allow_failure=True,
+            endpoints=self.endpoints,
+            # Snaps keep the plan's keys and only hold on to the values
+            columnar=True,
+        )
         # multi.printCalls()
+        return multi
+
+    def update_plan(self, entities):
+        """
+        Brings the compiled snap calls up to date with the entities, only
+        building calls for entities that were added or changed
+        """
+        if self.plan is None:
+            self.resolver.prepare_snap()
+            self.plan = CallPlan()
+            self.plan.set("block", self.resolver.add_block_snap([]))
+            self.plan.set("sett", self.resolver.add_sett_snap([]))
+
+        changed = False
+        for key, entity in entities.items():
+            if self.planEntities.get(key) != entity:
+                self.plan.set(("entity", key), self.entity_calls(key, entity))
+                self.planEntities[key] = entity
+                changed = True
+        for key in [key for key in self.planEntities if key not in entities]:
+            self.plan.remove(("entity", key))
+            del self.planEntities[key]
+            changed = True
+
+        # Strategy views may depend on the entity set
+        if changed or "strategy" not in self.plan:
+            self.plan.set(
+                "strategy", self.resolver.add_strategy_snap([], entities=entities)
+            )
+        return self.plan
 
-        data = multi()
-        self.snaps[snapBlock] = Snap(
-            data,
-            snapBlock,
-            [x[0] for x in entities.items()],
-        )
+    def entity_calls(self, key, entity):
+        calls = self.resolver.add_balances_snap([], {key: entity})
+        if key in self.nativeEntities:
+            calls = self.resolver.add_native_balances_snap(calls, {key: entity})
+        return calls
 
-        return self.snaps[snapBlock]
+    def record_snap(self, multi, data):
+        if multi.missing:
+            console.print(
+                "[yellow]Calls failed for: {}[/yellow]".format(", ".join(multi.missing))
+            )
+
+        # A pinned read is labelled with the block asked for: ganache-cli 6
+        # runs eth_call in a child block, one past the one it reads
+        snapBlock = multi.block_identifier
+        if not is_pinned(snapBlock):
+            snapBlock = multi.block
+        snap = Snap(data, snapBlock, list(self.entities), multi.missing)
+        self.snaps[snapBlock] = snap
+        if self.store is not None:
+            self.store.put(snap)
+
+        return snap
 
     def addEntity(self, key, entity):
-        self.entities[key] = entity
+        # Interned, so calls encode it from raw bytes and never re-checksum it
+        self.entities[key] = to_address(entity)
+
+    def removeEntity(self, key):
+        self.entities.pop(key, None)
+
+    def trackNativeBalance(self, key):
+        self.nativeEntities.add(key)
+        # Rebuild the entity's calls on the next snap
+        self.planEntities.pop(key, None)
 
     def init_resolver(self, name):
         print("init_resolver", name)
@@ -80,7 +349,7 @@ class SnapshotManager:
         trackedUsers = {"user": user}
         before = self.snap(trackedUsers)
         tx = self.strategy.tend(overrides)
-        after = self.snap(trackedUsers)
+        after = self.snapAfter(before, tx, trackedUsers)
         if confirm:
             self.resolver.confirm_tend(before, after, tx)
 
@@ -89,7 +358,7 @@ class SnapshotManager:
         trackedUsers = {"user": user}
         before = self.snap(trackedUsers)
         tx = self.strategy.harvest(overrides)
-        after = self.snap(trackedUsers)
+        after = self.snapAfter(before, tx, trackedUsers)
         if confirm:
             self.resolver.confirm_harvest(before, after, tx)
 
@@ -97,8 +366,8 @@ class SnapshotManager:
         user = overrides["from"].address
         trackedUsers = {"user": user}
         before = self.snap(trackedUsers)
-        self.sett.deposit(amount, overrides)
-        after = self.snap(trackedUsers)
+        tx = self.sett.deposit(amount, overrides)
+        after = self.snapAfter(before, tx, trackedUsers)
 
         if confirm:
             self.resolver.confirm_deposit(
@@ -110,8 +379,8 @@ class SnapshotManager:
         trackedUsers = {"user": user}
         userBalance = self.want.balanceOf(user)
         before = self.snap(trackedUsers)
-        self.sett.depositAll(overrides)
-        after = self.snap(trackedUsers)
+        tx = self.sett.depositAll(overrides)
+        after = self.snapAfter(before, tx, trackedUsers)
         if confirm:
             self.resolver.confirm_deposit(
                 before, after, {"user": user, "amount": userBalance}
@@ -121,8 +390,8 @@ class SnapshotManager:
         user = overrides["from"].address
         trackedUsers = {"user": user}
         before = self.snap(trackedUsers)
-        self.sett.earn(overrides)
-        after = self.snap(trackedUsers)
+        tx = self.sett.earn(overrides)
+        after = self.snapAfter(before, tx, trackedUsers)
         if confirm:
             self.resolver.confirm_earn(before, after, {"user": user})
 
@@ -131,7 +400,7 @@ class SnapshotManager:
         trackedUsers = {"user": user}
         before = self.snap(trackedUsers)
         tx = self.sett.withdraw(amount, overrides)
-        after = self.snap(trackedUsers)
+        after = self.snapAfter(before, tx, trackedUsers)
         if confirm:
             self.resolver.confirm_withdraw(
                 before, after, {"user": user, "amount": amount}, tx
@@ -143,7 +412,7 @@ class SnapshotManager:
         userBalance = self.sett.balanceOf(user)
         before = self.snap(trackedUsers)
         tx = self.sett.withdraw(userBalance, overrides)
-        after = self.snap(trackedUsers)
+        after = self.snapAfter(before, tx, trackedUsers)
 
         if confirm:
             self.resolver.confirm_withdraw(
@@ -183,7 +452,8 @@ class SnapshotManager:
         for key, item in before.data.items():
 
             a = item
-            b = after.get(key)
+            # Keys that failed to load in the after snap show up as None
+            b = after.data.get(key)
 
             # Don't add items that don't change
             if a != b:
@@ -207,16 +477,19 @@ class SnapshotManager:
         table = []
         console.print("[blue]=== Permissions: {} Sett ===[/blue]".format(self.key))
 
-        table.append(["sett.keeper", self.sett.keeper()])
-        table.append(["sett.governance", self.sett.governance()])
-        table.append(["sett.strategist", self.sett.strategist()])
+        with Batch():
+            sett = batch(self.sett)
+            strategy = batch(self.strategy)
+            table.append(["sett.keeper", sett.keeper()])
+            table.append(["sett.governance", sett.governance()])
+            table.append(["sett.strategist", sett.strategist()])
 
-        table.append(["---------------", "--------------------"])
+            table.append(["---------------", "--------------------"])
 
-        table.append(["strategy.keeper", self.strategy.keeper()])
-        table.append(["strategy.governance", self.strategy.governance()])
-        table.append(["strategy.strategist", self.strategy.strategist()])
-        table.append(["strategy.guardian", self.strategy.guardian()])
+            table.append(["strategy.keeper", strategy.keeper()])
+            table.append(["strategy.governance", strategy.governance()])
+            table.append(["strategy.strategist", strategy.strategist()])
+            table.append(["strategy.guardian", strategy.guardian()])
 
         table.append(["---------------", "--------------------"])
         print(tabulate(table, headers=["account", "value"]))
@@ -5,7 +5,8 @@ from helpers.utils import (
     approx,
 )
 from helpers.constants import *
-from helpers.multicall import Call, as_wei, func
+from helpers.multicall import Call, Multicall, as_wei, func
+from helpers.multicall.multicall import multicall3_address
 from rich.console import Console
 
 console = Console()
@@ -14,9 +15,37 @@ console = Console()
 class StrategyCoreResolver:
     def __init__(self, manager):
         self.manager = manager
+        # Whether the aggregator can read BASEFEE, see prepare_snap
+        self.hasBasefee = False
 
     # ===== Read strategy data =====
 
+    def prepare_snap(self):
+        """
+        Resolves what the snap calls depend on, once per snap plan
+        (Strategy May Implement, calling super)
+        """
+        self.hasBasefee = self.probe_basefee()
+
+    def probe_basefee(self):
+        """
+        Reads BASEFEE once through the aggregator. Pre-London nodes, e.g.
+        ganache-cli 6, and the injected Multicall3 build can't
+        """
+        probe = Multicall(
+            [
+                Call(
+                    multicall3_address(web3.chain_id),
+                    [func.multicall3.getBasefee],
+                    [["block.basefee", None]],
+                )
+            ],
+            allow_failure=True,
+            endpoints=self.manager.endpoints,
+        )
+        probe()
+        return not probe.missing
+
     def add_entity_shares_for_tokens(self, calls, tokenKey, token, entities):
         for entityKey, entity in entities.items():
             calls.append(
@@ -49,6 +78,46 @@ class StrategyCoreResolver:
         calls = self.add_entity_balances_for_tokens(calls, "sett", sett, entities)
         return calls
 
+    def add_block_snap(self, calls):
+        """
+        Block metadata read through the Multicall3 helper views, in the same
+        aggregate call as the rest of the snap
+        """
+        multicall3 = multicall3_address(web3.chain_id)
+
+        calls.append(
+            Call(multicall3, [func.multicall3.getBlockNumber], [["block.number", None]])
+        )
+        calls.append(
+            Call(
+                multicall3,
+                [func.multicall3.getCurrentBlockTimestamp],
+                [["block.timestamp", None]],
+            )
+        )
+        if self.hasBasefee:
+            calls.append(
+                Call(
+                    multicall3, [func.multicall3.getBasefee], [["block.basefee", None]]
+                )
+            )
+
+        return calls
+
+    def add_native_balances_snap(self, calls, entities):
+        multicall3 = multicall3_address(web3.chain_id)
+
+        for entityKey, entity in entities.items():
+            calls.append(
+                Call(
+                    multicall3,
+                    [func.multicall3.getEthBalance, entity],
+                    [["balances.native." + entityKey, as_wei]],
+                )
+            )
+
+        return calls
+
     def add_sett_snap(self, calls):
         sett = self.manager.sett
 
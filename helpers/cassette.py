@@ -0,0 +1,183 @@
+"""
+Record/replay of the JSON-RPC traffic between a fork and its upstream node.
+
+The stand-in server takes the place of the upstream node in the fork
+settings, so every read made through brownie.web3 or the multicall helpers
+that the fork has to fetch upstream goes through the cassette:
+
+- record: answers from the cassette, forwarding and storing what's missing.
+  Upstream failures, transient JSON-RPC errors such as rate limits included,
+  get a JSON-RPC error and aren't stored
+- replay: answers from the cassette only, misses get a JSON-RPC error and are
+  listed in `misses`, meaning the cassette needs re-recording
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+RECORD = "record"
+REPLAY = "replay"
+
+# JSON-RPC error code returned for requests missing from a replayed cassette
+MISS_ERROR = -32099
+# JSON-RPC error code returned when the upstream node fails while recording
+UPSTREAM_ERROR = -32098
+# JSON-RPC errors of the node's state rather than of the request: limit
+# exceeded, internal error, and rate limits reported as HTTP status codes
+TRANSIENT_ERRORS = {-32005, -32603, 429}
+TRANSIENT_MESSAGES = ["rate limit", "too many requests", "timeout", "timed out"]
+
+
+def is_transient(error):
+    """
+    Whether a JSON-RPC error may not happen again, so mustn't be recorded
+    """
+    if error is None:
+        return False
+    if error.get("code") in TRANSIENT_ERRORS:
+        return True
+    message = str(error.get("message", "")).lower()
+    return any(fragment in message for fragment in TRANSIENT_MESSAGES)
+
+
+def request_key(block, method, params):
+    """
+    Hash identifying a request at a fork block, regardless of its id
+    """
+    payload = json.dumps([block, method, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class Cassette:
+    """
+    Responses keyed by request_key, stored as gzipped JSON
+    """
+
+    def __init__(self, path, block=None):
+        self.path = path
+        # Fork block the responses were recorded for, None when forked at latest
+        self.block = block
+        self.entries = {}
+        self.misses = []
+        self.hits = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, "rt") as f:
+                cassette = json.load(f)
+            self.block = cassette["block"] if block is None else block
+            self.entries = cassette["entries"]
+
+    def get(self, method, params):
+        key = request_key(self.block, method, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses.append((method, params))
+            else:
+                self.hits += 1
+            return entry
+
+    def set(self, method, params, entry):
+        with self.lock:
+            self.entries[request_key(self.block, method, params)] = entry
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            cassette = {"block": self.block, "entries": self.entries}
+            with gzip.open(self.path, "wt") as f:
+                json.dump(cassette, f, separators=(",", ":"))
+            self.dirty = False
+
+
+class CassetteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cassette, mode=REPLAY, upstream=None):
+        if mode == RECORD and not upstream:
+            raise ValueError("Recording a cassette needs an upstream node")
+        super().__init__(("127.0.0.1", 0), CassetteHandler)
+        self.cassette = cassette
+        self.mode = mode
+        self.upstream = upstream
+        self.session = requests.Session()
+
+    @property
+    def uri(self):
+        return "http://127.0.0.1:{}".format(self.server_port)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def answer(self, request):
+        entry = self.cassette.get(request["method"], request["params"])
+        if entry is None:
+            if self.mode == RECORD:
+                try:
+                    response = self.session.post(self.upstream, json=request)
+                    response.raise_for_status()
+                    body = response.json()
+                    if is_transient(body.get("error")):
+                        raise ValueError(body["error"].get("message"))
+                except (requests.RequestException, ValueError) as error:
+                    # Not recorded, so the request goes upstream again next time
+                    entry = {
+                        "error": {
+                            "code": UPSTREAM_ERROR,
+                            "message": "Upstream failed: {}".format(error),
+                        }
+                    }
+                else:
+                    entry = {
+                        key: value
+                        for key, value in body.items()
+                        if key in ("result", "error")
+                    }
+                    self.cassette.set(request["method"], request["params"], entry)
+            else:
+                entry = {
+                    "error": {
+                        "code": MISS_ERROR,
+                        "message": "Cassette miss: {}".format(request["method"]),
+                    }
+                }
+        return dict(entry, jsonrpc="2.0", id=request.get("id"))
+
+
+class CassetteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Keep-alive responses otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(body, list):
+            response = [self.server.answer(request) for request in body]
+        else:
+            response = self.server.answer(body)
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(path, mode=REPLAY, upstream=None, block=None):
+    """
+    Starts a stand-in node for the cassette at path, see the module docstring
+    """
+    return CassetteServer(Cassette(path, block), mode, upstream).start()
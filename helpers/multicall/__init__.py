@@ -4,7 +4,11 @@ https://github.com/banteg/multicall.py
 """
 __version__ = "0.1.1"
 
-from helpers.multicall.signature import Signature
+from helpers.multicall.signature import Signature, get_signature
 from helpers.multicall.call import Call
 from helpers.multicall.multicall import Multicall
+from helpers.multicall.result import ColumnarResult
 from helpers.multicall.functions import func, as_wei
+from helpers.multicall.rpc import RpcBatch
+from helpers.multicall.endpoints import EndpointPool
+from helpers.multicall.proxy import Batch, batch, resolve
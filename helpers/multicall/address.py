@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+from eth_utils import to_checksum_address
+
+# Distinct address spellings kept interned, enough for large holder snapshots
+ADDRESS_CACHE_SIZE = 100_000
+
+
+class Address(str):
+    """
+    Checksummed address string that also carries its raw 20 bytes for encoding
+    """
+
+    def __new__(cls, checksummed):
+        address = super().__new__(cls, checksummed)
+        address.raw = bytes.fromhex(checksummed[2:])
+        return address
+
+    @property
+    def address(self):
+        # Quacks like a brownie Account or Contract
+        return self
+
+
+def to_address(value):
+    """
+    Returns the interned Address for a hex string, 20 raw bytes, or anything
+    with an .address, e.g. a brownie Account or Contract. The keccak based
+    checksum is only computed the first time an address is seen
+    """
+    if isinstance(value, Address):
+        return value
+    value = getattr(value, "address", value)
+    if isinstance(value, bytes):
+        # bytes.hex, as HexBytes.hex may already prefix 0x
+        value = "0x" + bytes.hex(value)
+    # Every spelling of an address maps to the same instance
+    return intern_address(value.lower())
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def intern_address(address):
+    return Address(to_checksum_address(address))
@@ -0,0 +1,65 @@
+"""
+asyncio JSON-RPC transport used by Call.acall and Multicall.acall
+"""
+
+import asyncio
+import itertools
+import weakref
+
+import aiohttp
+from brownie import web3
+
+from helpers import provider
+
+# aiohttp sessions are bound to the loop they were created on
+sessions = weakref.WeakKeyDictionary()
+chain_ids = {}
+request_ids = itertools.count()
+
+
+def get_session():
+    loop = asyncio.get_running_loop()
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            # Connections shared by every in-flight request of the loop
+            connector=aiohttp.TCPConnector(limit=provider.default.max_in_flight)
+        )
+        sessions[loop] = session
+    return session
+
+
+async def close():
+    """
+    Closes the connection pool of the running event loop
+    """
+    session = sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def request(method, params, endpoint_uri=None):
+    endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+    payload = {
+        "jsonrpc": "2.0",
+        "id": next(request_ids),
+        "method": method,
+        "params": params,
+    }
+    body = await provider.default.apost(get_session(), endpoint_uri, payload)
+    if "error" in body:
+        raise ValueError(body["error"])
+    return body["result"]
+
+
+async def chain_id(endpoint_uri=None):
+    endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+    if endpoint_uri not in chain_ids:
+        chain_ids[endpoint_uri] = int(
+            await request("eth_chainId", [], endpoint_uri), 16
+        )
+    return chain_ids[endpoint_uri]
+
+
+async def block_number(endpoint_uri=None):
+    return int(await request("eth_blockNumber", [], endpoint_uri), 16)
@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# In-memory entries kept before the least recently used ones are dropped
+CACHE_SIZE = 100_000
+
+# Cache used by Call and Multicall when none is passed explicitly
+active = None
+
+
+def enable(maxsize=CACHE_SIZE, path=None):
+    """
+    Turns on read caching for every Call and Multicall, optionally backed by
+    an SQLite file at path
+    """
+    global active
+    active = ReadCache(maxsize, path)
+    return active
+
+
+def disable():
+    global active
+    active = None
+
+
+def is_pinned(block_identifier):
+    """
+    Only reads at an explicit block number are immutable, and thus cacheable
+    """
+    return isinstance(block_identifier, int) and not isinstance(block_identifier, bool)
+
+
+def resolve(cache, block_identifier):
+    """
+    Returns the cache to use for a read: the active one when cache is None,
+    and none when cache is False or the read isn't block-pinned
+    """
+    if cache is None:
+        cache = active
+    if cache and is_pinned(block_identifier):
+        return cache
+    return None
+
+
+def register_revert(obj):
+    """
+    Has brownie call obj._revert(height) and obj._reset() when the local chain
+    is reverted or reset, a no-op outside of brownie
+    """
+    try:
+        from brownie.network.state import _revert_register
+    except ImportError:
+        return
+    _revert_register(obj)
+
+
+class ReadCache:
+    """
+    Read-through cache of eth_call outputs keyed by (chainId, block hash,
+    target, calldata). Keys carry the hash rather than the number, so a height
+    mined again after a chain.revert() never hits the old reads.
+
+    The hash of a block number is looked up once and remembered until brownie
+    reverts or resets the chain below it, so warm reads make no request.
+    NB: Reorgs of a live chain deeper than a pinned read aren't noticed
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, path=None):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # {(chainId, block number): block hash}
+        self.hashes = {}
+        # Lookups come from the Multicall worker threads
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS reads (key TEXT PRIMARY KEY, value BLOB)"
+            )
+        register_revert(self)
+
+    @staticmethod
+    def key(chain_id, block_hash, target, calldata):
+        return "{}:{}:{}:{}".format(
+            chain_id, block_hash, target.lower(), bytes(calldata).hex()
+        )
+
+    def block_hash(self, chain_id, number):
+        with self.lock:
+            return self.hashes.get((chain_id, number))
+
+    def set_block_hash(self, chain_id, number, block_hash):
+        with self.lock:
+            self.hashes[(chain_id, number)] = block_hash
+
+    def _revert(self, height):
+        # Blocks above height may be mined again with other contents
+        with self.lock:
+            self.hashes = {
+                key: block_hash
+                for key, block_hash in self.hashes.items()
+                if key[1] <= height
+            }
+
+    def _reset(self):
+        with self.lock:
+            self.hashes = {}
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value FROM reads WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.hits += 1
+                    self.remember(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def set_many(self, items):
+        with self.lock:
+            for key, value in items:
+                self.remember(key, value)
+            if self.db is not None:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO reads VALUES (?, ?)",
+                    [(key, bytes(value)) for key, value in items],
+                )
+                self.db.commit()
+
+    def remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
@@ -1,26 +1,72 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/call.py
-from eth_utils import to_checksum_address
+from hexbytes import HexBytes
 from brownie import web3
-from helpers.multicall import Signature
+from helpers.multicall import aio
+from helpers.multicall import cache as read_cache
+from helpers.multicall.address import to_address
+from helpers.multicall.signature import get_signature
+
+# Offset of the bytes member inside an encoded (address,bytes) tuple
+ELEMENT_DATA_OFFSET = (2 * 32).to_bytes(32, "big")
+
+
+def encode_element(target, data):
+    """
+    ABI encodes (target, data) as one entry of an aggregator's (address,bytes)[],
+    target being an Address
+    """
+    return b"".join(
+        [
+            bytes(12),
+            target.raw,
+            ELEMENT_DATA_OFFSET,
+            len(data).to_bytes(32, "big"),
+            data,
+            bytes(-len(data) % 32),
+        ]
+    )
 
 
 class Call:
     def __init__(self, target, function, returns=None):
-        self.target = to_checksum_address(target)
+        self.target = to_address(target)
         if isinstance(function, list):
             self.function, *self.args = function
         else:
             self.function = function
             self.args = None
-        self.signature = Signature(self.function)
+        self.signature = get_signature(self.function)
         self.returns = returns
+        # Calls are never mutated, so calldata is encoded once up front
+        self.data = self.signature.encode_data(self.args)
+        self._element = None
 
     @property
-    def data(self):
-        return self.signature.encode_data(self.args)
+    def element(self):
+        """
+        Pre-encoded aggregator entry, usually a view into a CallPlan buffer
+        """
+        if self._element is None:
+            self._element = encode_element(self.target, self.data)
+        return self._element
+
+    @element.setter
+    def element(self, value):
+        self._element = value
 
     def decode_output(self, output):
-        decoded = self.signature.decode_data(output)
+        return self.format_output(self.signature.decode_data(output))
+
+    def format_values(self, decoded):
+        """
+        Handled values in the order of returns, for columnar results
+        """
+        return [
+            handler(value) if handler else value
+            for (_, handler), value in zip(self.returns or [], decoded)
+        ]
+
+    def format_output(self, decoded):
         if self.returns:
             return {
                 name: handler(value) if handler else value
@@ -29,8 +75,166 @@ class Call:
         else:
             return decoded if len(decoded) > 1 else decoded[0]
 
-    def __call__(self, args=None):
-        args = args or self.args
-        calldata = self.signature.encode_data(args)
-        output = web3.eth.call({"to": self.target, "data": calldata})
-        return self.decode_output(output)
+    def __call__(
+        self,
+        args=None,
+        block_identifier=None,
+        state_override=None,
+        cache=None,
+        endpoints=None,
+    ):
+        calldata = self.signature.encode_data(args) if args else self.data
+        return self.decode_output(
+            self.fetch(calldata, block_identifier, state_override, cache, endpoints)
+        )
+
+    async def acall(
+        self,
+        args=None,
+        block_identifier=None,
+        state_override=None,
+        cache=None,
+        endpoints=None,
+    ):
+        calldata = self.signature.encode_data(args) if args else self.data
+        return self.decode_output(
+            await self.afetch(
+                calldata, block_identifier, state_override, cache, endpoints
+            )
+        )
+
+    def params(self, calldata, block_identifier=None, state_override=None):
+        """
+        Raw eth_call params, the state override being a third positional param
+        """
+        params = [
+            {"to": self.target, "data": HexBytes(calldata).hex()},
+            block_param(block_identifier),
+        ]
+        if state_override:
+            params.append(state_override)
+        return params
+
+    def fetch(
+        self,
+        calldata,
+        block_identifier=None,
+        state_override=None,
+        cache=None,
+        endpoints=None,
+    ):
+        """
+        Runs eth_call with already encoded calldata and returns the raw output.
+        Goes through the EndpointPool passed as endpoints, or else web3
+        """
+        cache = read_cache.resolve(cache, block_identifier)
+        if cache:
+            chain_id = endpoints.chain_id() if endpoints else web3.chain_id
+            key = cache.key(
+                chain_id,
+                block_hash(block_identifier, endpoints, cache, chain_id),
+                self.target,
+                calldata,
+            )
+            output = cache.get(key)
+            if output is not None:
+                return output
+
+        if endpoints:
+            output = HexBytes(
+                endpoints.request(
+                    "eth_call", self.params(calldata, block_identifier, state_override)
+                )
+            )
+        elif state_override:
+            # web3.eth.call has no state override parameter, send the raw request
+            output = HexBytes(
+                web3.manager.request_blocking(
+                    "eth_call", self.params(calldata, block_identifier, state_override)
+                )
+            )
+        else:
+            output = web3.eth.call(
+                {"to": self.target, "data": bytes(calldata)}, block_identifier
+            )
+        if cache:
+            cache.set(key, output)
+        return output
+
+    async def afetch(
+        self,
+        calldata,
+        block_identifier=None,
+        state_override=None,
+        cache=None,
+        endpoints=None,
+    ):
+        """
+        Async version of fetch
+        """
+        cache = read_cache.resolve(cache, block_identifier)
+        if cache:
+            chain_id = await (endpoints.achain_id() if endpoints else aio.chain_id())
+            key = cache.key(
+                chain_id,
+                await ablock_hash(block_identifier, endpoints, cache, chain_id),
+                self.target,
+                calldata,
+            )
+            output = cache.get(key)
+            if output is not None:
+                return output
+
+        params = self.params(calldata, block_identifier, state_override)
+        if endpoints:
+            output = HexBytes(await endpoints.arequest("eth_call", params))
+        else:
+            output = HexBytes(await aio.request("eth_call", params))
+        if cache:
+            cache.set(key, output)
+        return output
+
+
+def block_param(block_identifier):
+    if block_identifier is None:
+        return "latest"
+    if isinstance(block_identifier, int):
+        return hex(block_identifier)
+    return block_identifier
+
+
+def block_hash(block_identifier, endpoints=None, cache=None, chain_id=None):
+    """
+    Hex hash of a block, without 0x, only looked up once per block when a
+    ReadCache is given
+    """
+    if cache is not None:
+        known = cache.block_hash(chain_id, block_identifier)
+        if known is not None:
+            return known
+    if endpoints:
+        block = endpoints.request(
+            "eth_getBlockByNumber", [block_param(block_identifier), False]
+        )
+    else:
+        block = web3.eth.get_block(block_identifier)
+    value = bytes.hex(HexBytes(block["hash"]))
+    if cache is not None:
+        cache.set_block_hash(chain_id, block_identifier, value)
+    return value
+
+
+async def ablock_hash(block_identifier, endpoints=None, cache=None, chain_id=None):
+    if cache is not None:
+        known = cache.block_hash(chain_id, block_identifier)
+        if known is not None:
+            return known
+    params = [block_param(block_identifier), False]
+    if endpoints:
+        block = await endpoints.arequest("eth_getBlockByNumber", params)
+    else:
+        block = await aio.request("eth_getBlockByNumber", params)
+    value = bytes.hex(HexBytes(block["hash"]))
+    if cache is not None:
+        cache.set_block_hash(chain_id, block_identifier, value)
+    return value
@@ -26,3 +26,18 @@ MULTICALL_ADDRESSES = {
     Network.BSC: "0xec8c00da6ce45341fb8c31653b598ca0d8251804",
     Network.Arbitrum: "0x7A7443F8c577d537f1d8cD4a629d40a3148Dd7ee",
 }
+
+# Multicall3 is deployed at the same address on every chain it supports
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ADDRESSES = {
+    Network.Mainnet: MULTICALL3_ADDRESS,
+    Network.Kovan: MULTICALL3_ADDRESS,
+    Network.Rinkeby: MULTICALL3_ADDRESS,
+    Network.Görli: MULTICALL3_ADDRESS,
+    Network.xDai: MULTICALL3_ADDRESS,
+    Network.Fantom: MULTICALL3_ADDRESS,
+    Network.Forknet: MULTICALL3_ADDRESS,
+    Network.BSC: MULTICALL3_ADDRESS,
+    Network.Arbitrum: MULTICALL3_ADDRESS,
+}
@@ -0,0 +1,292 @@
+"""
+Pool of JSON-RPC endpoints that Multicall, RpcBatch and the snapshot layer
+spread their reads across
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import aiohttp
+import requests
+
+from helpers import provider
+from helpers.multicall import aio
+
+# Recent latencies kept per endpoint and request kind to derive hedge thresholds
+LATENCY_SAMPLES = 100
+MIN_SAMPLES = 10
+# A request slower than this percentile of its endpoint's latencies for the
+# same kind of request is hedged
+HEDGE_PERCENTILE = 0.95
+# Hedge threshold in seconds until an endpoint has MIN_SAMPLES latencies
+HEDGE_DELAY = 1.0
+# Consecutive transport failures after which an endpoint sits out EJECT_SECONDS
+MAX_FAILURES = 3
+EJECT_SECONDS = 30
+TIMEOUT = 30
+# Requests, hedges included, in flight on a pool's threads
+MAX_IN_FLIGHT = 64
+
+
+def request_kind(payload):
+    """
+    Latency class of a request: its method, or "batch", and its size within a
+    factor of 4, so a large aggregate eth_call isn't held to the latency of
+    eth_blockNumber
+    """
+    method = "batch" if isinstance(payload, list) else payload["method"]
+    return method, len(json.dumps(payload)).bit_length() // 2
+
+
+class Endpoint:
+    def __init__(self, uri, weight=1):
+        self.uri = uri
+        self.weight = weight
+        # {request kind: recent latencies}
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self.failures = 0
+        self.ejected_until = 0
+        self.lock = threading.Lock()
+
+    def healthy(self):
+        return self.ejected_until <= time.monotonic()
+
+    def record(self, kind, latency):
+        with self.lock:
+            self.latencies[kind].append(latency)
+            self.failures = 0
+
+    def fail(self, max_failures, eject_seconds):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= max_failures:
+                self.ejected_until = time.monotonic() + eject_seconds
+                self.failures = 0
+
+    def percentile(self, kind, q, default):
+        with self.lock:
+            samples = sorted(self.latencies.get(kind, ()))
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class EndpointPool:
+    """
+    Weighted set of RPC endpoints serving the same chain.
+
+    Every request goes to an endpoint picked by weight among the healthy ones.
+    If it hasn't answered after the endpoint's HEDGE_PERCENTILE latency for
+    that kind of request (method and size), the same request is re-issued to
+    a second endpoint and the first answer wins.
+    Transport failures are retried on another endpoint, and endpoints failing
+    MAX_FAILURES times in a row are ejected for EJECT_SECONDS.
+
+    NB: Endpoints should be in sync, a lagging one can't serve reads pinned to
+    a block it hasn't seen yet
+    """
+
+    def __init__(
+        self,
+        endpoints,
+        hedge_percentile=HEDGE_PERCENTILE,
+        hedge_delay=HEDGE_DELAY,
+        max_failures=MAX_FAILURES,
+        eject_seconds=EJECT_SECONDS,
+        timeout=TIMEOUT,
+    ):
+        # Either a list of URIs or a {uri: weight} dict
+        if not isinstance(endpoints, dict):
+            endpoints = {uri: 1 for uri in endpoints}
+        self.endpoints = [Endpoint(uri, weight) for uri, weight in endpoints.items()]
+        if not self.endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(MAX_IN_FLIGHT)
+        self.chain = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a pool from the comma separated RPC_ENDPOINTS and optional
+        RPC_ENDPOINT_WEIGHTS variables, returns None when they aren't set
+        """
+        uris = os.getenv("RPC_ENDPOINTS")
+        if not uris:
+            return None
+        uris = [uri.strip() for uri in uris.split(",")]
+        weights = os.getenv("RPC_ENDPOINT_WEIGHTS")
+        weights = [float(weight) for weight in weights.split(",")] if weights else []
+        return cls(dict(zip(uris, weights + [1] * (len(uris) - len(weights)))))
+
+    def chain_id(self):
+        if self.chain is None:
+            self.chain = int(self.request("eth_chainId", []), 16)
+        return self.chain
+
+    async def achain_id(self):
+        if self.chain is None:
+            self.chain = int(await self.arequest("eth_chainId", []), 16)
+        return self.chain
+
+    def pick(self, exclude=()):
+        """
+        Weighted pick among healthy endpoints, falling back to ejected ones
+        """
+        candidates = [
+            endpoint
+            for endpoint in self.endpoints
+            if endpoint not in exclude and endpoint.healthy()
+        ] or [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None
+        return random.choices(
+            candidates, weights=[endpoint.weight for endpoint in candidates]
+        )[0]
+
+    def hedge_after(self, endpoint, kind):
+        return endpoint.percentile(kind, self.hedge_percentile, self.hedge_delay)
+
+    def send(self, endpoint, payload, kind):
+        started = time.monotonic()
+        try:
+            # Failing over to another endpoint beats retrying the same one
+            body = provider.default.send(
+                endpoint.uri, retries=0, json=payload, timeout=self.timeout
+            ).json()
+        except requests.RequestException:
+            endpoint.fail(self.max_failures, self.eject_seconds)
+            raise
+        endpoint.record(kind, time.monotonic() - started)
+        return body
+
+    def post(self, payload):
+        """
+        POSTs a JSON-RPC request or batch and returns the decoded response body
+        """
+        kind = request_kind(payload)
+        tried = []
+        pending = {}
+
+        def launch():
+            endpoint = self.pick(tried)
+            if endpoint is not None:
+                tried.append(endpoint)
+                pending[self.executor.submit(self.send, endpoint, payload, kind)] = (
+                    endpoint
+                )
+
+        launch()
+        hedged = False
+        error = None
+        while pending:
+            timeout = None if hedged else self.hedge_after(tried[0], kind)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                del pending[future]
+                try:
+                    # A slower duplicate still in flight is left to finish and
+                    # only feeds its endpoint's latency samples
+                    return future.result()
+                except requests.RequestException as e:
+                    error = e
+            if not pending:
+                launch()
+        raise error
+
+    def request(self, method, params):
+        body = self.post(
+            {
+                "jsonrpc": "2.0",
+                "id": next(aio.request_ids),
+                "method": method,
+                "params": params,
+            }
+        )
+        if "error" in body:
+            raise ValueError(body["error"])
+        return body["result"]
+
+    async def asend(self, endpoint, payload, kind):
+        started = time.monotonic()
+        try:
+            body = await provider.default.apost(
+                aio.get_session(),
+                endpoint.uri,
+                payload,
+                retries=0,
+                timeout=self.timeout,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            endpoint.fail(self.max_failures, self.eject_seconds)
+            raise
+        endpoint.record(kind, time.monotonic() - started)
+        return body
+
+    async def apost(self, payload):
+        """
+        Async version of post, the losing duplicate of a hedge is cancelled
+        """
+        kind = request_kind(payload)
+        tried = []
+        pending = {}
+
+        def launch():
+            endpoint = self.pick(tried)
+            if endpoint is not None:
+                tried.append(endpoint)
+                task = asyncio.ensure_future(self.asend(endpoint, payload, kind))
+                pending[task] = endpoint
+
+        launch()
+        hedged = False
+        error = None
+        try:
+            while pending:
+                timeout = None if hedged else self.hedge_after(tried[0], kind)
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    del pending[task]
+                    try:
+                        return task.result()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        error = e
+                if not pending:
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def arequest(self, method, params):
+        body = await self.apost(
+            {
+                "jsonrpc": "2.0",
+                "id": next(aio.request_ids),
+                "method": method,
+                "params": params,
+            }
+        )
+        if "error" in body:
+            raise ValueError(body["error"])
+        return body["result"]
@@ -60,6 +60,14 @@ pancakeChef = DotMap(
     pendingCake="pendingCake(uint256,uint256)(uint256)",
     userInfo="userInfo(uint256,address)(uint256,uint256)",
 )
+registry = DotMap(get="get(string)(address)")
+# Helper views of the Multicall3 aggregator itself
+multicall3 = DotMap(
+    getBlockNumber="getBlockNumber()(uint256)",
+    getCurrentBlockTimestamp="getCurrentBlockTimestamp()(uint256)",
+    getBasefee="getBasefee()(uint256)",
+    getEthBalance="getEthBalance(address)(uint256)",
+)
 
 func = DotMap(
     erc20=erc20,
@@ -69,4 +77,6 @@ func = DotMap(
     diggFaucet=diggFaucet,
     digg=digg,
     pancakeChef=pancakeChef,
+    registry=registry,
+    multicall3=multicall3,
 )
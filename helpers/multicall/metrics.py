@@ -0,0 +1,121 @@
+"""
+Per-batch instrumentation for Multicall, reported to pluggable hooks.
+
+Multicall emits a "batch" event per aggregator eth_call and a "result" event
+per result decoding pass. Events are only built when a hook is registered,
+so the cost with none is a couple of perf_counter() calls per batch.
+"""
+
+import json
+import os
+import threading
+import time
+
+clock = time.perf_counter
+
+# Callables receiving every event dict
+hooks = []
+
+
+def add_hook(hook):
+    hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def emit(event):
+    for hook in hooks:
+        hook(event)
+
+
+def emit_batch(calls, output, outputs, started, encoded, fetched, decoded):
+    """
+    Reports one aggregator round trip from the clock() readings taken around it
+    """
+    emit(
+        {
+            "event": "batch",
+            "calls": len(calls),
+            "encode_time": encoded - started,
+            "rpc_time": fetched - encoded,
+            "response_bytes": len(output),
+            "decode_time": decoded - fetched,
+            "failures": sum(1 for success, _ in outputs if not success),
+        }
+    )
+
+
+def emit_result(success, started):
+    emit(
+        {
+            "event": "result",
+            "calls": len(success),
+            "decode_time": clock() - started,
+            "failures": success.count(False),
+        }
+    )
+
+
+class JsonLinesExporter:
+    """
+    Hook appending every event as one JSON object per line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(dict(event, timestamp=time.time()))
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class PrometheusExporter:
+    """
+    Hook summing events into counters, rendered in the Prometheus text format.
+
+    Every numeric field becomes multicall_<event>_<field>_total, with *_time
+    fields exported in seconds, next to a multicall_<event>_total event count
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        kind = event["event"]
+        with self.lock:
+            self.add("multicall_{}_total".format(kind), 1)
+            for field, value in event.items():
+                if field == "event":
+                    continue
+                if field.endswith("_time"):
+                    field = field[: -len("_time")] + "_seconds"
+                self.add("multicall_{}_{}_total".format(kind, field), value)
+
+    def add(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+        lines = []
+        for name, value in counters:
+            lines.append("# TYPE {} counter".format(name))
+            lines.append("{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Atomically writes the counters, e.g. for node_exporter's textfile collector
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
@@ -1,18 +1,249 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/multicall.py
-from typing import List
+import asyncio
+import copy
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import List, Union
 
 from brownie import web3
+from eth_abi.exceptions import DecodingError
+from hexbytes import HexBytes
 
-from helpers.multicall import Call
-from helpers.multicall.constants import MULTICALL_ADDRESSES
+from helpers.multicall import Call, aio, metrics
+from helpers.multicall import cache as read_cache
+from helpers.multicall.call import ablock_hash, block_hash
+from helpers.multicall.plan import CallPlan
+from helpers.multicall.result import ColumnarResult, result_keys
+from helpers.multicall.constants import (
+    MULTICALL_ADDRESSES,
+    MULTICALL3_ADDRESS,
+    MULTICALL3_ADDRESSES,
+)
 from rich.console import Console
 
 console = Console()
 
+# Per-batch budgets, kept below the eth_call limits of public RPC nodes
+MAX_CALLDATA_BYTES = 128 * 1024
+MAX_GAS = 25_000_000
+# Rough upper bound for a simple view called through the aggregator
+GAS_PER_CALL = 100_000
+MAX_WORKERS = 4
+
+# Node error messages that mean the batch was too big rather than broken
+SIZE_ERRORS = [
+    "out of gas",
+    "gas required exceeds",
+    "exceeds block gas limit",
+    "request entity too large",
+    "payload too large",
+    "response size",
+    "response too large",
+]
+# HTTP status of a request body over the node's limit
+PAYLOAD_TOO_LARGE = 413
+# HTTP status and JSON-RPC codes of rate limiting, which smaller batches only
+# make worse
+RATE_LIMITED = {429, -32005}
+
+
+def encoded_size(call):
+    """
+    Bytes a call adds to the aggregate calldata: its entry plus its offset word
+    """
+    return 32 + len(call.element)
+
+
+def encode_aggregate(selector, head, elements):
+    """
+    Assembles calldata for an aggregator function whose last argument is the
+    (address,bytes)[] array, from the entries pre-encoded by each Call
+    """
+    offsets = []
+    offset = 32 * len(elements)
+    for element in elements:
+        offsets.append(offset.to_bytes(32, "big"))
+        offset += len(element)
+    array_offset = (32 * (len(head) + 1)).to_bytes(32, "big")
+    return b"".join(
+        [selector, *head, array_offset, len(elements).to_bytes(32, "big")]
+        + offsets
+        + elements
+    )
+
+
+def read_word(view, offset):
+    if offset + 32 > len(view):
+        # Empty when the aggregator isn't deployed at the block read
+        raise DecodingError(
+            "Aggregator response of {} bytes is too short".format(len(view))
+        )
+    return int.from_bytes(view[offset : offset + 32], "big")
+
+
+def read_bytes(view, offset):
+    """
+    Slices the ABI bytes value at offset out of the response without copying
+    """
+    start = offset + 32
+    end = start + read_word(view, offset)
+    if end > len(view):
+        raise DecodingError("Aggregator response is truncated")
+    return view[start:end]
+
+
+def decode_aggregate(output):
+    """
+    Decodes aggregate's (uint256,bytes[]) response into the block number and
+    memoryview slices of each call's return data
+    """
+    view = memoryview(output)
+    array = read_word(view, 32)
+    head = array + 32
+    outputs = [
+        read_bytes(view, head + read_word(view, head + 32 * i))
+        for i in range(read_word(view, array))
+    ]
+    return read_word(view, 0), outputs
+
+
+def decode_try_aggregate(output):
+    """
+    Decodes tryBlockAndAggregate's (uint256,bytes32,(bool,bytes)[]) response
+    into the block number and (success, return data slice) pairs
+    """
+    view = memoryview(output)
+    array = read_word(view, 64)
+    head = array + 32
+    outputs = []
+    for i in range(read_word(view, array)):
+        item = head + read_word(view, head + 32 * i)
+        outputs.append(
+            (
+                read_word(view, item) != 0,
+                read_bytes(view, item + read_word(view, item + 32)),
+            )
+        )
+    return read_word(view, 0), outputs
+
+
+@lru_cache(maxsize=None)
+def aggregator_override():
+    """
+    State override that places the Multicall3 runtime bytecode, compiled from
+    contracts/deps/Multicall3.sol, at the canonical Multicall3 address
+    """
+    from brownie import Multicall3
+
+    code = HexBytes(Multicall3._build["deployedBytecode"]).hex()
+    return {MULTICALL3_ADDRESS: {"code": code}}
+
+
+def aggregator(addresses, chain_id):
+    """
+    Returns the aggregator address for the chain and the state override needed
+    to call it, which is None when a deployment is known
+    """
+    if chain_id in addresses:
+        return addresses[chain_id], None
+    return MULTICALL3_ADDRESS, aggregator_override()
+
+
+def multicall3_address(chain_id):
+    """
+    Where Multicall3 can be called on the chain, with allow_failure Multicalls
+    injecting it when there's no known deployment
+    """
+    return aggregator(MULTICALL3_ADDRESSES, chain_id)[0]
+
+
+def dedupe(calls):
+    """
+    Collapses calls with the same (target, calldata). Returns the unique calls
+    and, for every original call, the position of its unique call
+    """
+    positions = {}
+    unique = []
+    index = []
+    for call in calls:
+        key = (call.target, call.data)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(call)
+        index.append(positions[key])
+    return unique, index
+
+
+def error_code(error):
+    """
+    HTTP status or JSON-RPC error code of a failed request, None if it has none
+    """
+    # requests.HTTPError and aiohttp.ClientResponseError respectively
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if status is not None:
+        return status
+    if error.args and isinstance(error.args[0], dict):
+        return error.args[0].get("code")
+    return None
+
+
+def is_size_error(error):
+    code = error_code(error)
+    if code == PAYLOAD_TOO_LARGE:
+        return True
+    if code in RATE_LIMITED:
+        return False
+    # Only the node's message, revert data may contain anything
+    if error.args and isinstance(error.args[0], dict):
+        message = str(error.args[0].get("message", ""))
+    else:
+        message = str(error)
+    message = message.lower()
+    return "rate limit" not in message and any(
+        fragment in message for fragment in SIZE_ERRORS
+    )
+
 
 class Multicall:
-    def __init__(self, calls: List[Call]):
+    def __init__(
+        self,
+        calls: Union[List[Call], CallPlan],
+        max_calldata=MAX_CALLDATA_BYTES,
+        max_gas=MAX_GAS,
+        gas_per_call=GAS_PER_CALL,
+        workers=MAX_WORKERS,
+        block_identifier=None,
+        allow_failure=False,
+        cache=None,
+        endpoints=None,
+        columnar=False,
+    ):
+        # Result names and positions of a plan, taken as compiled now as the
+        # plan may be changed and recompiled while this Multicall is in flight
+        self.keys = None
+        self.index = None
+        if isinstance(calls, CallPlan):
+            plan = calls.compile()
+            calls, self.keys, self.index = plan.calls, plan.keys, plan.index
         self.calls = calls
+        self.block_identifier = block_identifier
+        self.allow_failure = allow_failure
+        # ReadCache for block-pinned reads, None for the active one, False for none
+        self.cache = cache
+        # EndpointPool the batches are spread across, None to go through web3
+        self.endpoints = endpoints
+        # Return a ColumnarResult instead of a dict
+        self.columnar = columnar
+        # Block the results were read at, as reported by the aggregator
+        self.block = None
+        # Per-call success flags and the result keys of failed calls
+        self.success = []
+        self.missing = []
+        self.max_calldata = max_calldata
+        self.max_gas = max_gas
+        self.gas_per_call = gas_per_call
+        self.workers = workers
 
     def printCalls(self):
         for call in self.calls:
@@ -20,14 +251,337 @@ class Multicall:
                 {"target": call.target, "function": call.function, "args": call.args}
             )
 
+    def chunks(self, calls=None):
+        """
+        Splits the calls into batches that fit both the calldata and gas budgets
+        """
+        chunks = []
+        chunk = []
+        size = 0
+        for call in self.calls if calls is None else calls:
+            call_size = encoded_size(call)
+            if chunk and (
+                size + call_size > self.max_calldata
+                or (len(chunk) + 1) * self.gas_per_call > self.max_gas
+            ):
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+            chunk.append(call)
+            size += call_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def aggregate_call(self, calls, chain_id):
+        """
+        Builds the aggregator Call, its calldata and state override for a batch
+        """
+        if self.allow_failure:
+            address, override = aggregator(MULTICALL3_ADDRESSES, chain_id)
+            aggregate = Call(
+                address,
+                "tryBlockAndAggregate(bool,(address,bytes)[])"
+                "(uint256,bytes32,(bool,bytes)[])",
+            )
+            # requireSuccess = false
+            head = [bytes(32)]
+        else:
+            address, override = aggregator(MULTICALL_ADDRESSES, chain_id)
+            aggregate = Call(address, "aggregate((address,bytes)[])(uint256,bytes[])")
+            head = []
+        calldata = encode_aggregate(
+            aggregate.signature.fourbyte, head, [call.element for call in calls]
+        )
+        return aggregate, calldata, override
+
+    def unpack(self, output, size):
+        """
+        Normalizes both aggregator responses to the block number and
+        (success, output) pairs, outputs being views into the response, for
+        a batch of size calls
+        """
+        if self.allow_failure:
+            block, outputs = decode_try_aggregate(output)
+        else:
+            block, outputs = decode_aggregate(output)
+            outputs = [(True, output) for output in outputs]
+        if len(outputs) != size:
+            raise DecodingError(
+                "Aggregator returned {} results for {} calls".format(len(outputs), size)
+            )
+        return block, outputs
+
+    def aggregate(self, calls, block_identifier=None):
+        """
+        Runs one aggregate eth_call, halving the batch when the node rejects it
+        for size reasons. Returns the block number and (success, output) pairs
+        """
+        chain_id = self.chain_id()
+        started = metrics.clock()
+        aggregate, calldata, override = self.aggregate_call(calls, chain_id)
+        encoded = metrics.clock()
+        try:
+            # Sub-calls are cached individually by the Multicall, not as a batch
+            output = aggregate.fetch(
+                calldata, block_identifier, override, False, self.endpoints
+            )
+        except Exception as error:
+            if len(calls) == 1 or not is_size_error(error):
+                raise
+            if block_identifier is None or block_identifier == "latest":
+                block_identifier = self.block_number()
+            half = len(calls) // 2
+            block, head = self.aggregate(calls[:half], block_identifier)
+            block, tail = self.aggregate(calls[half:], block_identifier)
+            return block, head + tail
+        return self.unpack_batch(calls, output, started, encoded)
+
+    async def aaggregate(self, calls, block_identifier=None):
+        """
+        Async version of aggregate
+        """
+        chain_id = await self.achain_id()
+        started = metrics.clock()
+        aggregate, calldata, override = self.aggregate_call(calls, chain_id)
+        encoded = metrics.clock()
+        try:
+            output = await aggregate.afetch(
+                calldata, block_identifier, override, False, self.endpoints
+            )
+        except Exception as error:
+            if len(calls) == 1 or not is_size_error(error):
+                raise
+            if block_identifier is None or block_identifier == "latest":
+                block_identifier = await self.ablock_number()
+            half = len(calls) // 2
+            (block, head), (block, tail) = await asyncio.gather(
+                self.aaggregate(calls[:half], block_identifier),
+                self.aaggregate(calls[half:], block_identifier),
+            )
+            return block, head + tail
+        return self.unpack_batch(calls, output, started, encoded)
+
+    def chain_id(self):
+        if self.endpoints:
+            return self.endpoints.chain_id()
+        return web3.chain_id
+
+    async def achain_id(self):
+        if self.endpoints:
+            return await self.endpoints.achain_id()
+        return await aio.chain_id()
+
+    def block_number(self):
+        if self.endpoints:
+            return int(self.endpoints.request("eth_blockNumber", []), 16)
+        return web3.eth.block_number
+
+    async def ablock_number(self):
+        if self.endpoints:
+            return int(await self.endpoints.arequest("eth_blockNumber", []), 16)
+        return await aio.block_number()
+
+    def unpack_batch(self, calls, output, started, encoded):
+        """
+        Decodes an aggregator response and reports the batch to metrics hooks
+        """
+        fetched = metrics.clock()
+        block, outputs = self.unpack(output, len(calls))
+        if metrics.hooks:
+            metrics.emit_batch(
+                calls, output, outputs, started, encoded, fetched, metrics.clock()
+            )
+        return block, outputs
+
     def __call__(self):
-        aggregate = Call(
-            MULTICALL_ADDRESSES[web3.eth.chainId],
-            "aggregate((address,bytes)[])(uint256,bytes[])",
+        cache = read_cache.resolve(self.cache, self.block_identifier)
+        if not cache:
+            self.block, outputs = self.execute(self.calls)
+            return self.decode(outputs)
+
+        chain_id = self.chain_id()
+        keys, outputs, pending = self.cached(
+            cache,
+            chain_id,
+            block_hash(self.block_identifier, self.endpoints, cache, chain_id),
         )
-        args = [[[call.target, call.data] for call in self.calls]]
-        block, outputs = aggregate(args)
+        self.block = self.block_identifier
+        if pending:
+            self.block, fetched = self.execute(pending)
+            self.fill(cache, keys, outputs, fetched)
+        return self.decode(outputs)
+
+    def at_block(self, block_identifier):
+        """
+        Copy of this Multicall, sharing its calls, that reads at another block
+        """
+        multi = copy.copy(self)
+        multi.block_identifier = block_identifier
+        multi.block = None
+        multi.success = []
+        multi.missing = []
+        return multi
+
+    def over_blocks(self, blocks, concurrency=None):
+        """
+        Runs the calls at every block, at most `concurrency` blocks at a time,
+        and yields (Multicall, result) pairs in completion order. The yielded
+        Multicall holds the block, success flags and missing keys of its result
+        """
+        concurrency = concurrency or self.workers
+        blocks = iter(blocks)
+        with ThreadPoolExecutor(concurrency) as pool:
+            pending = set()
+            while True:
+                # Only a window of blocks is submitted, so consumers that stop
+                # early don't leave thousands of reads queued
+                for block in blocks:
+                    multi = self.at_block(block)
+                    future = pool.submit(multi)
+                    future.multi = multi
+                    pending.add(future)
+                    if len(pending) >= 2 * concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.multi, future.result()
+
+    async def acall(self):
+        """
+        Async version of __call__. Chunks are sent concurrently on the event
+        loop's shared connection pool, at most `workers` at a time
+        """
+        cache = read_cache.resolve(self.cache, self.block_identifier)
+        if not cache:
+            self.block, outputs = await self.aexecute(self.calls)
+            return self.decode(outputs)
+
+        chain_id = await self.achain_id()
+        keys, outputs, pending = self.cached(
+            cache,
+            chain_id,
+            await ablock_hash(self.block_identifier, self.endpoints, cache, chain_id),
+        )
+        self.block = self.block_identifier
+        if pending:
+            self.block, fetched = await self.aexecute(pending)
+            self.fill(cache, keys, outputs, fetched)
+        return self.decode(outputs)
+
+    def execute(self, calls):
+        """
+        Fetches the calls, sending each distinct (target, calldata) only once
+        """
+        calls, index = dedupe(calls)
+        block_identifier = self.block_identifier
+        chunks = self.chunks(calls)
+        if len(chunks) <= 1:
+            block, outputs = (
+                self.aggregate(chunks[0], block_identifier) if chunks else (None, [])
+            )
+            return block, [outputs[i] for i in index]
+
+        # Every chunk must read the same state, so pin "latest" up front
+        if block_identifier is None or block_identifier == "latest":
+            block_identifier = self.block_number()
+        block = None
+        outputs = []
+        with ThreadPoolExecutor(min(self.workers, len(chunks))) as pool:
+            # map() yields in submission order, so outputs line up with calls
+            for block, chunk_outputs in pool.map(
+                lambda chunk: self.aggregate(chunk, block_identifier), chunks
+            ):
+                outputs += chunk_outputs
+        return block, [outputs[i] for i in index]
+
+    async def aexecute(self, calls):
+        calls, index = dedupe(calls)
+        block_identifier = self.block_identifier
+        chunks = self.chunks(calls)
+        if len(chunks) > 1 and (
+            block_identifier is None or block_identifier == "latest"
+        ):
+            block_identifier = await self.ablock_number()
+
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def run(chunk):
+            async with semaphore:
+                return await self.aaggregate(chunk, block_identifier)
+
+        block = None
+        outputs = []
+        # gather() keeps submission order, so outputs line up with calls
+        for block, chunk_outputs in await asyncio.gather(*map(run, chunks)):
+            outputs += chunk_outputs
+        return block, [outputs[i] for i in index]
+
+    def cached(self, cache, chain_id, block_hash):
+        """
+        Looks every call up in the cache. Returns the cache keys, the
+        (success, output) pairs found with None for misses, and the missed calls
+        """
+        keys = [
+            cache.key(chain_id, block_hash, call.target, call.data)
+            for call in self.calls
+        ]
+        outputs = []
+        for key in keys:
+            output = cache.get(key)
+            outputs.append(None if output is None else (True, output))
+        pending = [call for call, output in zip(self.calls, outputs) if output is None]
+        return keys, outputs, pending
+
+    def fill(self, cache, keys, outputs, fetched):
+        """
+        Slots the fetched pairs into the misses and caches the successful ones
+        """
+        fetched = iter(fetched)
+        reads = []
+        for i, output in enumerate(outputs):
+            if output is None:
+                outputs[i] = next(fetched)
+                success, data = outputs[i]
+                if success:
+                    # Copied, a view would keep the whole response alive
+                    reads.append((keys[i], bytes(data)))
+        cache.set_many(reads)
+
+    def decode(self, outputs):
+        started = metrics.clock()
         result = {}
-        for call, output in zip(self.calls, outputs):
-            result.update(call.decode_output(output))
+        values = []
+        self.success = []
+        self.missing = []
+        # Deduped calls share the same output object, decode it only once
+        decoded = {}
+        for call, (success, output) in zip(self.calls, outputs):
+            if success:
+                try:
+                    key = (id(output), call.signature)
+                    if key not in decoded:
+                        decoded[key] = call.signature.decode_data(output)
+                    if self.columnar:
+                        values += call.format_values(decoded[key])
+                    else:
+                        result.update(call.format_output(decoded[key]))
+                except DecodingError:
+                    # Views on non-contracts "succeed" with empty return data
+                    if not self.allow_failure:
+                        raise
+                    success = False
+            if not success:
+                self.missing += [name for name, _ in call.returns or []]
+                if self.columnar:
+                    values += [None] * len(call.returns or [])
+            self.success.append(success)
+        if metrics.hooks:
+            metrics.emit_result(self.success, started)
+        if self.columnar:
+            if self.keys is not None:
+                return ColumnarResult(self.keys, values, self.index)
+            return ColumnarResult(result_keys(self.calls), values)
         return result
@@ -0,0 +1,59 @@
+from helpers.multicall.result import result_keys
+
+
+class CallPlan:
+    """
+    Compiled list of calls that is reused across Multicall executions.
+
+    Calls are grouped in named segments, e.g. one per tracked entity, so a
+    segment can be swapped without touching the others. Compiling lays every
+    pre-encoded aggregator entry out in one contiguous buffer, which the
+    Multicall slices its batches from instead of re-encoding calls.
+    """
+
+    def __init__(self):
+        self.segments = {}
+        self.calls = []
+        self.buffer = b""
+        # Result names of the compiled calls and their positions
+        self.keys = ()
+        self.index = {}
+        self.dirty = False
+
+    def __contains__(self, key):
+        return key in self.segments
+
+    def set(self, key, calls):
+        """
+        Adds or replaces a segment, an existing one keeps its position
+        """
+        self.segments[key] = calls
+        self.dirty = True
+        return self
+
+    def remove(self, key):
+        if self.segments.pop(key, None) is not None:
+            self.dirty = True
+        return self
+
+    def compile(self):
+        if not self.dirty:
+            return self
+
+        calls = [call for segment in self.segments.values() for call in segment]
+        # Only calls new to the plan are encoded, the rest is copied from the
+        # previous buffer
+        buffer = b"".join(call.element for call in calls)
+        view = memoryview(buffer)
+        offset = 0
+        for call in calls:
+            size = len(call.element)
+            call.element = view[offset : offset + size]
+            offset += size
+
+        self.calls = calls
+        self.buffer = buffer
+        self.keys = result_keys(calls)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.dirty = False
+        return self
@@ -0,0 +1,184 @@
+"""
+Batched view calls generated from brownie contract ABIs, e.g.
+
+    with Batch():
+        pool = batch(strategy).balanceOfPool()
+        keeper = batch(sett).keeper()
+    pool.value, keeper.value
+"""
+
+import threading
+
+from helpers.multicall.address import to_address
+from helpers.multicall.call import Call
+from helpers.multicall.multicall import Multicall
+
+# Stack of open Batch contexts, per thread
+local = threading.local()
+
+
+def abi_type(param):
+    """
+    Canonical type of an ABI input or output, expanding tuples
+    """
+    if not param["type"].startswith("tuple"):
+        return param["type"]
+    components = ",".join(abi_type(component) for component in param["components"])
+    return "({}){}".format(components, param["type"][len("tuple") :])
+
+
+def abi_signature(item):
+    """
+    Builds the 'name(inputs)(outputs)' string used by Call from an ABI entry
+    """
+    return "{}({})({})".format(
+        item["name"],
+        ",".join(abi_type(param) for param in item["inputs"]),
+        ",".join(abi_type(param) for param in item["outputs"]),
+    )
+
+
+def is_view(item):
+    return item["type"] == "function" and (
+        item.get("stateMutability") in ("view", "pure") or item.get("constant")
+    )
+
+
+def current():
+    stack = getattr(local, "stack", None)
+    if not stack:
+        raise ValueError("batch() calls must be made inside a `with Batch():` block")
+    return stack[-1]
+
+
+def batch(contract):
+    """
+    Wraps a brownie Contract or interface so its views queue into the
+    innermost open Batch and return a Pending
+    """
+    return ContractProxy(contract)
+
+
+def resolve(pending):
+    """
+    Replaces the Pendings of a dict or list with their values
+    """
+    if isinstance(pending, dict):
+        return {key: value.value for key, value in pending.items()}
+    return [value.value for value in pending]
+
+
+class Pending:
+    """
+    Result of a queued view, available once its Batch has been flushed
+    """
+
+    def __init__(self, call):
+        self.call = call
+        self.resolved = False
+        self.success = None
+        self.result = None
+
+    @property
+    def value(self):
+        if not self.resolved:
+            raise ValueError(
+                "{} hasn't been flushed yet".format(self.call.signature.function)
+            )
+        return self.result
+
+    def set(self, success, values):
+        self.resolved = True
+        self.success = success
+        # Failed views resolve to None, like in a columnar Multicall result
+        if success:
+            self.result = values[0] if len(values) == 1 else tuple(values)
+
+    def __str__(self):
+        return str(self.result) if self.resolved else repr(self)
+
+    def __repr__(self):
+        if not self.resolved:
+            return "<Pending {}>".format(self.call.signature.function)
+        return repr(self.result)
+
+
+class Batch:
+    """
+    Collects the views called through batch() and runs them as one Multicall
+    when the with block exits, or on flush(). Takes the Multicall arguments
+    """
+
+    def __init__(self, **multicall):
+        self.multicall = multicall
+        self.pending = []
+        # Block the last flush read at
+        self.block = None
+
+    def __enter__(self):
+        if not hasattr(local, "stack"):
+            local.stack = []
+        local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        local.stack.remove(self)
+        if exc_type is None:
+            self.flush()
+
+    def add(self, call):
+        pending = Pending(call)
+        self.pending.append(pending)
+        return pending
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        multi = Multicall(
+            [item.call for item in pending], columnar=True, **self.multicall
+        )
+        values = multi().results
+        offset = 0
+        for item, success in zip(pending, multi.success):
+            size = len(item.call.returns)
+            item.set(success, values[offset : offset + size])
+            offset += size
+        self.block = multi.block
+
+
+class ContractProxy:
+    def __init__(self, contract):
+        self.contract = contract
+
+    def __getattr__(self, name):
+        views = [
+            item for item in self.contract.abi if is_view(item) and item["name"] == name
+        ]
+        if not views:
+            raise AttributeError(
+                "{} has no view named {}".format(self.contract.address, name)
+            )
+
+        def queue(*args):
+            # Overloads are told apart by their number of arguments
+            matches = [item for item in views if len(item["inputs"]) == len(args)]
+            if not matches:
+                raise TypeError("No {} overload takes {} args".format(name, len(args)))
+            item = matches[0]
+            returns = [
+                [
+                    "{}.{}".format(name, output["name"] or i),
+                    to_address if output["type"] == "address" else None,
+                ]
+                for i, output in enumerate(item["outputs"])
+            ]
+            call = Call(
+                self.contract.address,
+                # Accounts and contracts are passed by address
+                [abi_signature(item), *[getattr(arg, "address", arg) for arg in args]],
+                returns,
+            )
+            return current().add(call)
+
+        return queue
@@ -0,0 +1,65 @@
+import sys
+from collections.abc import Mapping
+
+
+def result_keys(calls):
+    """
+    Interned result names of the calls, in the order their values are decoded
+    """
+    return tuple(sys.intern(name) for call in calls for name, _ in call.returns or [])
+
+
+class ColumnarResult(Mapping):
+    """
+    Multicall result as parallel keys and values, values of failed calls being
+    None. Doubles as a read-only dict view that skips the failed keys
+    """
+
+    def __init__(self, names, results, index=None):
+        self.names = names
+        self.results = results
+        # {key: position}, shared by the results of one CallPlan
+        self.index = index
+
+    def position(self, key):
+        if self.index is None:
+            self.index = {name: i for i, name in enumerate(self.names)}
+        return self.index[key]
+
+    def __getitem__(self, key):
+        value = self.results[self.position(key)]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (key for key, value in self.columns() if value is not None)
+
+    def __len__(self):
+        return len(self.results) - self.results.count(None)
+
+    def columns(self):
+        return zip(self.names, self.results)
+
+    def select(self, prefix):
+        """
+        Keys and values of the entries whose key starts with prefix, e.g.
+        "balances.want." for the want balances of every entity
+        """
+        pairs = [
+            (key, value) for key, value in self.columns() if key.startswith(prefix)
+        ]
+        return [key for key, _ in pairs], [value for _, value in pairs]
+
+    def to_dict(self):
+        return {key: value for key, value in self.columns() if value is not None}
+
+    def numpy(self):
+        """
+        Values as a NumPy object array, which keeps uint256 values exact
+        """
+        import numpy as np
+
+        values = np.empty(len(self.results), dtype=object)
+        values[:] = self.results
+        return values
@@ -0,0 +1,103 @@
+from brownie import web3
+from hexbytes import HexBytes
+
+from helpers import provider
+from helpers.multicall.call import block_param
+
+
+def to_int(value):
+    return int(value, 16)
+
+
+class RpcBatch:
+    """
+    Packs heterogeneous JSON-RPC requests into a single HTTP batch and decodes
+    the responses into the same result dict shape as Multicall
+    """
+
+    def __init__(self, endpoint_uri=None, endpoints=None, allow_failure=False):
+        # EndpointPool to send the batch through instead of endpoint_uri
+        self.endpoints = endpoints
+        self.allow_failure = allow_failure
+        # {key: error} of the failed requests, instead of raising, when allowed
+        self.errors = {}
+        self.endpoint_uri = endpoint_uri
+        if not endpoints:
+            self.endpoint_uri = endpoint_uri or web3.provider.endpoint_uri
+        # (method, params, handler, keys) where handler folds the raw result into
+        # the dict, under keys
+        self.requests = []
+
+    def add(self, key, method, params, decoder=None):
+        def handler(result, value):
+            result[key] = decoder(value) if decoder else value
+
+        self.requests.append((method, params, handler, [key]))
+        return self
+
+    def call(self, call, block_identifier=None):
+        """
+        Queues a helpers.multicall Call as a plain eth_call
+        """
+
+        def handler(result, value):
+            result.update(call.decode_output(HexBytes(value)))
+
+        params = [
+            {"to": call.target, "data": HexBytes(call.data).hex()},
+            block_param(block_identifier),
+        ]
+        keys = [name for name, _ in call.returns or []]
+        self.requests.append(("eth_call", params, handler, keys))
+        return self
+
+    def get_balance(self, key, address, block_identifier=None):
+        return self.add(
+            key, "eth_getBalance", [address, block_param(block_identifier)], to_int
+        )
+
+    def get_storage_at(self, key, address, slot, block_identifier=None):
+        return self.add(
+            key,
+            "eth_getStorageAt",
+            [address, hex(slot), block_param(block_identifier)],
+            HexBytes,
+        )
+
+    def get_code(self, key, address, block_identifier=None):
+        return self.add(
+            key, "eth_getCode", [address, block_param(block_identifier)], HexBytes
+        )
+
+    def __call__(self):
+        if not self.requests:
+            return {}
+
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params, _, _) in enumerate(self.requests)
+        ]
+        if self.endpoints:
+            body = self.endpoints.post(payload)
+        else:
+            body = provider.default.post(self.endpoint_uri, payload)
+
+        if not isinstance(body, list):
+            # Nodes without batch support, or rate limiting, answer the whole
+            # batch with a single error
+            raise ValueError(body.get("error", body))
+
+        # Nodes may answer a batch in any order
+        responses = {item["id"]: item for item in body}
+        result = {}
+        self.errors = {}
+        for i, (method, params, handler, keys) in enumerate(self.requests):
+            item = responses[i]
+            if "error" in item:
+                if not self.allow_failure:
+                    raise ValueError(item["error"])
+                for key in keys:
+                    self.errors[key] = item["error"]
+                continue
+            handler(result, item["result"])
+        return result
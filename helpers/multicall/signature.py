@@ -1,8 +1,17 @@
 # Credit: https://github.com/banteg/multicall.py/blob/master/multicall/signature.py
+import re
+from functools import lru_cache, partial
 
-from eth_abi import encode_single, decode_single
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.exceptions import DecodingError, EncodingTypeError, ValueOutOfBounds
+from eth_abi.registry import registry
 from eth_utils import function_signature_to_4byte_selector
 
+from helpers.multicall.address import to_address
+
+# Number of distinct signature strings kept compiled in the process-wide cache
+SIGNATURE_CACHE_SIZE = 1024
+
 
 def parse_signature(signature):
     """
@@ -25,6 +34,105 @@ def parse_signature(signature):
     return parts
 
 
+def decode_uint(view, offset):
+    return int.from_bytes(view[offset : offset + 32], "big")
+
+
+def decode_int(view, offset):
+    return int.from_bytes(view[offset : offset + 32], "big", signed=True)
+
+
+def decode_bool(view, offset):
+    return view[offset + 31] != 0
+
+
+def decode_address(view, offset):
+    # Lowercase, like eth_abi
+    return "0x" + view[offset + 12 : offset + 32].hex()
+
+
+def decode_fixed_bytes(size, view, offset):
+    return bytes(view[offset : offset + size])
+
+
+def fixed_decoder(abi_type):
+    """
+    Decoder reading a static ABI type from its 32 byte head slot, None for
+    types left to eth_abi
+    """
+    if abi_type == "bool":
+        return decode_bool
+    if abi_type == "address":
+        return decode_address
+    if re.fullmatch(r"uint\d*", abi_type):
+        return decode_uint
+    if re.fullmatch(r"int\d*", abi_type):
+        return decode_int
+    match = re.fullmatch(r"bytes(\d+)", abi_type)
+    if match:
+        return partial(decode_fixed_bytes, int(match.group(1)))
+    return None
+
+
+def fixed_decoders(output_types):
+    """
+    Decoders for each output type when all of them are fixed-width, else None
+    """
+    types = output_types[1:-1]
+    if not types or "(" in types or "[" in types:
+        return None
+    decoders = [fixed_decoder(abi_type) for abi_type in types.split(",")]
+    if None in decoders:
+        return None
+    return decoders
+
+
+def encode_address(value):
+    return bytes(12) + to_address(value).raw
+
+
+def encode_uint256(value):
+    # Rejects what eth_abi rejects, with its exceptions
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise EncodingTypeError(
+            "Value {!r} of type {} cannot be encoded as uint256".format(
+                value, type(value)
+            )
+        )
+    if not 0 <= value < 2**256:
+        raise ValueOutOfBounds("Value {} cannot be encoded in 256 bits".format(value))
+    return value.to_bytes(32, "big")
+
+
+def encode_bool(value):
+    if not isinstance(value, bool):
+        raise EncodingTypeError(
+            "Value {!r} of type {} cannot be encoded as bool".format(value, type(value))
+        )
+    return (1 if value else 0).to_bytes(32, "big")
+
+
+# Input types encoded without eth_abi, addresses straight from interned bytes
+FIXED_ENCODERS = {
+    "address": encode_address,
+    "uint256": encode_uint256,
+    "bool": encode_bool,
+}
+
+
+def fixed_encoders(input_types):
+    """
+    Encoders for each input type when all of them are in FIXED_ENCODERS, else None
+    """
+    types = input_types[1:-1]
+    if not types:
+        return None
+    encoders = [FIXED_ENCODERS.get(abi_type) for abi_type in types.split(",")]
+    if None in encoders:
+        return None
+    return encoders
+
+
 class Signature:
     def __init__(self, signature):
         self.signature = signature
@@ -33,13 +141,39 @@ class Signature:
         self.output_types = self.parts[2]
         self.function = "".join(self.parts[:2])
         self.fourbyte = function_signature_to_4byte_selector(self.function)
+        # Resolve the eth_abi codecs once instead of on every encode/decode
+        self.encoder = registry.get_encoder(self.input_types)
+        self.decoder = registry.get_decoder(self.output_types)
+        # Fast path for outputs made only of uint, int, bool, address or bytesN
+        self.fixed = fixed_decoders(self.output_types)
+        self.fixed_inputs = fixed_encoders(self.input_types)
 
     def encode_data(self, args=None):
-        return (
-            self.fourbyte + encode_single(self.input_types, args)
-            if args
-            else self.fourbyte
-        )
+        if not args:
+            return self.fourbyte
+        if self.fixed_inputs and len(args) == len(self.fixed_inputs):
+            return self.fourbyte + b"".join(
+                encode(arg) for encode, arg in zip(self.fixed_inputs, args)
+            )
+        return self.fourbyte + self.encoder(args)
 
     def decode_data(self, output):
-        return decode_single(self.output_types, output)
+        if self.fixed:
+            # NB: Unlike eth_abi, padding bytes aren't validated
+            if len(output) < 32 * len(self.fixed):
+                raise DecodingError(
+                    "{} bytes are too short for {}".format(
+                        len(output), self.output_types
+                    )
+                )
+            view = memoryview(output)
+            return tuple(decode(view, 32 * i) for i, decode in enumerate(self.fixed))
+        return self.decoder(ContextFramesBytesIO(output))
+
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def get_signature(signature):
+    """
+    Returns the interned, precompiled Signature for a signature string
+    """
+    return Signature(signature)
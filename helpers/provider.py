@@ -0,0 +1,218 @@
+"""
+Shared HTTP transport for JSON-RPC: one keep-alive connection pool with a cap
+on in-flight requests, a token bucket rate limiter and retries with jitter.
+
+brownie's web3 goes through it once install() was called, which every script
+does first thing. RpcBatch, EndpointPool and the asyncio transport always do.
+Limits are read from the environment:
+
+- RPC_MAX_IN_FLIGHT: concurrent requests (16)
+- RPC_RATE_LIMIT / RPC_BURST: requests per second and burst size (unlimited)
+- RPC_RETRIES: retries of connection errors, timeouts, 429 and 5xx (3), for
+  read-only requests only
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+MAX_IN_FLIGHT = int(os.getenv("RPC_MAX_IN_FLIGHT", 16))
+RATE_LIMIT = float(os.getenv("RPC_RATE_LIMIT", 0))
+BURST = int(os.getenv("RPC_BURST", 10))
+RETRIES = int(os.getenv("RPC_RETRIES", 3))
+# Base of the exponential backoff in seconds, before jitter
+BACKOFF = 0.5
+TIMEOUT = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods safe to send twice. Anything else, e.g. eth_send*, evm_mine or
+# evm_revert, could apply twice and is never retried
+READ_ONLY = {
+    "eth_call",
+    "eth_chainId",
+    "eth_blockNumber",
+    "eth_estimateGas",
+    "eth_gasPrice",
+    "eth_maxPriorityFeePerGas",
+    "eth_feeHistory",
+    "eth_accounts",
+    "eth_syncing",
+    "net_version",
+    "net_listening",
+    "web3_clientVersion",
+}
+# eth_get* reads, but for the filter changes consumed by every poll
+NOT_READ_ONLY = {"eth_getFilterChanges"}
+
+
+def is_read_only(method):
+    if method in NOT_READ_ONLY:
+        return False
+    return method in READ_ONLY or method.startswith("eth_get")
+
+
+def retries_for(payload):
+    """
+    Default retries for a JSON-RPC request or batch, none unless read-only
+    """
+    batch = payload if isinstance(payload, list) else [payload]
+    if all(is_read_only(request["method"]) for request in batch):
+        return None
+    return 0
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns how long to wait before it is valid
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+
+class Provider:
+    def __init__(
+        self,
+        max_in_flight=MAX_IN_FLIGHT,
+        rate_limit=RATE_LIMIT,
+        burst=BURST,
+        retries=RETRIES,
+        backoff=BACKOFF,
+        timeout=TIMEOUT,
+    ):
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        # Keep-alive connections, as many per host as requests may be in flight
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def delay(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    def throttle(self):
+        if self.bucket:
+            wait = self.bucket.reserve()
+            if wait:
+                time.sleep(wait)
+
+    def send(self, uri, retries=None, **kwargs):
+        """
+        POSTs to uri with the pool's limits and returns the successful response
+        """
+        retries = self.retries if retries is None else retries
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.throttle()
+            try:
+                with self.slots:
+                    response = self.session.post(uri, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def post(self, uri, payload, retries=None):
+        """
+        POSTs a JSON-RPC request or batch and returns the decoded body
+        """
+        if retries is None:
+            retries = retries_for(payload)
+        return self.send(uri, retries, json=payload).json()
+
+    async def apost(self, session, uri, payload, retries=None, timeout=None):
+        """
+        Async version of post on an aiohttp session, whose connector caps the
+        requests in flight
+        """
+        if retries is None:
+            retries = retries_for(payload)
+        retries = self.retries if retries is None else retries
+        timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        attempt = 0
+        while True:
+            if self.bucket:
+                wait = self.bucket.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+            try:
+                async with session.post(uri, json=payload, timeout=timeout) as response:
+                    if response.status not in RETRY_STATUSES or attempt >= retries:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            await asyncio.sleep(self.delay(attempt))
+            attempt += 1
+
+
+# Shared by everything in the process
+default = Provider()
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    web3 HTTPProvider sending its requests through the shared Provider
+    """
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        response = default.send(
+            self.endpoint_uri,
+            retries=None if is_read_only(method) else 0,
+            data=request_data,
+            **self.get_request_kwargs()
+        )
+        return self.decode_rpc_response(response.content)
+
+
+def install(web3=None):
+    """
+    Routes brownie's web3, or the given one, through the shared Provider. Call
+    it once connected, as brownie creates a new provider on every connect
+    """
+    if web3 is None:
+        from brownie import web3
+
+    provider = web3.provider
+    if isinstance(provider, HTTPProvider) and not isinstance(
+        provider, PooledHTTPProvider
+    ):
+        web3.provider = PooledHTTPProvider(
+            provider.endpoint_uri, request_kwargs=provider._request_kwargs
+        )
+    return web3
@@ -0,0 +1,102 @@
+"""
+Event-delta snaps: the ERC20 balances of an after-snap are derived from the
+before-snap and the Transfer logs of the transaction in between, so only the
+views no event describes (pricePerFullShare, balanceOfPool, native balances,
+block data...) are read again
+"""
+
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from helpers.multicall import func
+from helpers.multicall.address import to_address
+
+FULL = "full"
+DELTA = "delta"
+# Derives the balances then checks them against a full read of the same block
+VERIFY = "verify"
+MODES = (FULL, DELTA, VERIFY)
+
+TRANSFER_TOPIC = HexBytes(keccak(text="Transfer(address,address,uint256)"))
+
+
+def snap_mode(mode):
+    """
+    Validated SNAP_MODE value, one of FULL, DELTA or VERIFY
+    """
+    if mode not in MODES:
+        raise ValueError(
+            "Unknown snap mode {!r}, expected one of {}".format(mode, ", ".join(MODES))
+        )
+    return mode
+
+
+def transfers(logs):
+    """
+    (token, sender, receiver, amount) of the ERC20 Transfer logs, ERC721
+    transfers, with an indexed token id, being skipped
+    """
+    for log in logs:
+        topics = [HexBytes(topic) for topic in log["topics"]]
+        if len(topics) != 3 or topics[0] != TRANSFER_TOPIC:
+            continue
+        yield (
+            to_address(log["address"]),
+            to_address(topics[1][-20:]),
+            to_address(topics[2][-20:]),
+            int.from_bytes(HexBytes(log["data"]), "big"),
+        )
+
+
+def balance_keys(calls):
+    """
+    {(token, holder): [key]} of the ERC20 balanceOf calls, a holder tracked
+    as several entities having a key for each
+    """
+    keys = {}
+    for call in calls:
+        if call.function == func.erc20.balanceOf and call.returns:
+            holder = (call.target, to_address(call.args[0]))
+            keys.setdefault(holder, []).append(call.returns[0][0])
+    return keys
+
+
+def derive(before, calls, logs):
+    """
+    Splits calls into the {key: value} of the balances the logs account for,
+    and the calls that still have to be read. A balance is only derived if
+    it loaded in the before-snap
+    """
+    keys = balance_keys(calls)
+    derived = {}
+    for holderKeys in keys.values():
+        for key in holderKeys:
+            if key in before.index and before.values[before.index[key]] is not None:
+                derived[key] = before.values[before.index[key]]
+
+    for token, sender, receiver, amount in transfers(logs):
+        for key in keys.get((token, sender), []):
+            if key in derived:
+                derived[key] -= amount
+        for key in keys.get((token, receiver), []):
+            if key in derived:
+                derived[key] += amount
+
+    reads = [
+        call
+        for call in calls
+        if not call.returns or any(name not in derived for name, _ in call.returns)
+    ]
+    return derived, reads
+
+
+def mismatches(derived, full):
+    """
+    [(key, derived value, read value)] where a derived snap and a full read of
+    the same block disagree
+    """
+    return [
+        (key, value, full.data.get(key))
+        for key, value in derived.data.items()
+        if full.data.get(key) != value
+    ]
@@ -0,0 +1,175 @@
+"""
+Snaps of a SnapshotManager by block, with a retention policy. Snaps past it
+are spilled to disk and read back when their block is looked up again:
+
+- maxSnaps: keeps that many of the most recently taken or pinned snaps in
+  memory
+- maxAge: keeps the snaps whose block.timestamp is at most maxAge seconds
+  behind the latest snap's
+- pinned snaps stay in memory whatever the policy
+
+Deleting a snap only drops it from the history, never from the spill.
+"""
+
+import json
+import os
+import tempfile
+from collections.abc import MutableMapping
+
+from helpers.snapshot.snap import Snap
+
+
+def snap_time(snap):
+    try:
+        return snap.timestamp
+    except Exception:
+        # Snaps without a block snap are never too old
+        return None
+
+
+class SpillFile:
+    """
+    Evicted snaps as JSON lines, found again through their offsets. A path is
+    appended to, keeping what's already in it, e.g. another manager's spill.
+    Without a path, spills to a temporary file that goes away with the process
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.file = open(path, "ab+") if path else tempfile.TemporaryFile()
+        # {block: offset of its latest line}
+        self.offsets = {}
+
+    def __contains__(self, block):
+        return block in self.offsets
+
+    def blocks(self):
+        return list(self.offsets)
+
+    def put(self, snap):
+        self.file.seek(0, os.SEEK_END)
+        self.offsets[snap.block] = self.file.tell()
+        self.file.write(json.dumps(snap.dump()).encode() + b"\n")
+        self.file.flush()
+
+    def get(self, block):
+        self.file.seek(self.offsets[block])
+        return Snap.load(json.loads(self.file.readline()))
+
+    def close(self):
+        self.file.close()
+
+
+class SnapHistory(MutableMapping):
+    def __init__(self, maxSnaps=None, maxAge=None, spill=None, persisted=False):
+        self.maxSnaps = maxSnaps
+        self.maxAge = maxAge
+        # Created on the first eviction unless given, see SpillFile
+        self.spill = spill
+        # Whether snaps are put in the spill as they are taken, e.g. a
+        # SnapStore, so evicted snaps already in it are only dropped from memory
+        self.persisted = persisted
+        # In memory snaps, least recently added first
+        self.snaps = {}
+        # Blocks of the evicted snaps, read back from the spill
+        self.spilled = set()
+        # {name: block}
+        self.pins = {}
+        self.latest = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads the policy from SNAP_HISTORY_MAX, SNAP_HISTORY_MAX_AGE and
+        SNAP_HISTORY_SPILL, a path to spill to. Unbounded when none are set
+        """
+        maxSnaps = os.getenv("SNAP_HISTORY_MAX")
+        maxAge = os.getenv("SNAP_HISTORY_MAX_AGE")
+        spill = os.getenv("SNAP_HISTORY_SPILL")
+        return cls(
+            int(maxSnaps) if maxSnaps else None,
+            int(maxAge) if maxAge else None,
+            SpillFile(spill) if spill else None,
+        )
+
+    def __getitem__(self, block):
+        if block in self.snaps:
+            return self.snaps[block]
+        if block in self.spilled:
+            return self.spill.get(block)
+        raise KeyError(block)
+
+    def __setitem__(self, block, snap):
+        self.snaps.pop(block, None)
+        # An older spilled snap at the block is shadowed by this one
+        self.snaps[block] = snap
+        timestamp = snap_time(snap)
+        if timestamp is not None and (self.latest is None or timestamp > self.latest):
+            self.latest = timestamp
+        self.evict()
+
+    def __delitem__(self, block):
+        if block not in self:
+            raise KeyError(block)
+        self.snaps.pop(block, None)
+        self.spilled.discard(block)
+        self.pins = {name: pin for name, pin in self.pins.items() if pin != block}
+
+    def __contains__(self, block):
+        return block in self.snaps or block in self.spilled
+
+    def __iter__(self):
+        return iter(self.blocks())
+
+    def __len__(self):
+        return len(self.blocks())
+
+    def blocks(self):
+        return sorted(self.spilled.union(self.snaps))
+
+    def pin(self, name, block):
+        """
+        Keeps the snap at block in memory, and reachable by name through named
+        """
+        snap = self[block]
+        self.pins[name] = block
+        if block not in self.snaps:
+            self.snaps[block] = snap
+
+    def unpin(self, name):
+        self.pins.pop(name, None)
+        self.evict()
+
+    def named(self, name):
+        return self[self.pins[name]]
+
+    def evict(self):
+        pinned = set(self.pins.values())
+        evicted = set()
+        if self.maxAge is not None and self.latest is not None:
+            for block, snap in self.snaps.items():
+                timestamp = snap_time(snap)
+                if (
+                    block not in pinned
+                    and timestamp is not None
+                    and self.latest - timestamp > self.maxAge
+                ):
+                    evicted.add(block)
+        if self.maxSnaps is not None:
+            kept = [
+                block
+                for block in self.snaps
+                if block not in pinned and block not in evicted
+            ]
+            evicted.update(kept[: max(len(kept) - self.maxSnaps, 0)])
+        if not evicted:
+            return
+        if self.spill is None:
+            self.spill = SpillFile()
+        for block in evicted:
+            snap = self.snaps.pop(block)
+            # Snaps set without going through the store, e.g. loaded from a
+            # checkpoint, are only in memory
+            if not self.persisted or block not in self.spill:
+                self.spill.put(snap)
+            self.spilled.add(block)
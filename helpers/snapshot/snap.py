@@ -1,23 +1,129 @@
+import sys
+from functools import lru_cache
+
+from helpers.multicall.result import ColumnarResult
+
+# Key schemas of the snaps built from dicts, e.g. loaded from a checkpoint
+schemas = {}
+
+
+def schema(keys):
+    """
+    Interned keys and their {key: position} index, shared by every snap with
+    the same keys
+    """
+    keys = tuple(sys.intern(key) for key in keys)
+    if keys not in schemas:
+        schemas[keys] = (keys, {key: i for i, key in enumerate(keys)})
+    return schemas[keys]
+
+
+@lru_cache(maxsize=None)
+def entry_key(kind, tokenKey, accountKey):
+    return sys.intern(kind + "." + tokenKey + "." + accountKey)
+
+
 class Snap:
-    def __init__(self, data, block, entityKeys):
-        self.data = data
+    """
+    Values read at one block as a flat list, next to the keys and index shared
+    by every snap of the same call plan. Values of failed reads are None
+    """
+
+    __slots__ = ("keys", "index", "values", "block", "entityKeys")
+
+    def __init__(self, data, block, entityKeys, missing=None):
+        missing = missing or []
+        if isinstance(data, ColumnarResult):
+            self.keys, self.index = data.names, data.index
+            if self.index is None:
+                self.keys, self.index = schema(data.names)
+            self.values = data.results
+        else:
+            self.keys, self.index = schema(
+                [*data, *[key for key in missing if key not in data]]
+            )
+            self.values = [data.get(key) for key in self.keys]
+        for key in missing:
+            self.values[self.index[key]] = None
         self.block = block
-        self.entityKeys = entityKeys
+        self.entityKeys = schema(entityKeys)[0]
+
+    def dump(self):
+        """
+        JSON-able form, as written to checkpoints and spill files
+        """
+        return {
+            "block": self.block,
+            "data": self.data.to_dict(),
+            "missing": sorted(self.missing),
+            "entityKeys": list(self.entityKeys),
+        }
+
+    @classmethod
+    def load(cls, item, entityKeys=None):
+        """
+        Snap from its dump, entityKeys being used for dumps that lack theirs
+        """
+        return cls(
+            item["data"],
+            item["block"],
+            item.get("entityKeys", entityKeys or []),
+            item["missing"],
+        )
+
+    @property
+    def data(self):
+        """
+        Read-only {key: value} view of the values that loaded
+        """
+        return ColumnarResult(self.keys, self.values, self.index)
+
+    @property
+    def missing(self):
+        """
+        Keys whose call reverted when the snap was taken
+        """
+        return {key for key, value in zip(self.keys, self.values) if value is None}
 
     # ===== Getters =====
 
     def balances(self, tokenKey, accountKey):
-        return self.data["balances." + tokenKey + "." + accountKey]
+        return self.get(entry_key("balances", tokenKey, accountKey))
 
     def shares(self, tokenKey, accountKey):
-        return self.data["shares." + tokenKey + "." + accountKey]
+        return self.get(entry_key("shares", tokenKey, accountKey))
+
+    def nativeBalance(self, accountKey):
+        return self.balances("native", accountKey)
+
+    @property
+    def blockNumber(self):
+        return self.get("block.number")
+
+    @property
+    def timestamp(self):
+        return self.get("block.timestamp")
+
+    @property
+    def basefee(self):
+        return self.get("block.basefee")
 
     def get(self, key):
-        if key not in self.data.keys():
+        position = self.index.get(key)
+        if position is None:
             raise Exception("Key {} not found in snap data".format(key))
-        return self.data[key]
+        value = self.values[position]
+        if value is None:
+            raise Exception("Key {} failed to load in snap data".format(key))
+        return value
 
     # ===== Setters =====
 
     def set(self, key, value):
-        self.data[key] = value
+        position = self.index.get(key)
+        if position is None:
+            # The shared schema stays as is, this snap moves to a wider one
+            self.keys, self.index = schema([*self.keys, key])
+            self.values.append(value)
+        else:
+            self.values[position] = value
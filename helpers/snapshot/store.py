@@ -0,0 +1,279 @@
+"""
+Snaps persisted to SQLite, one row per (sett, block, key), so a run can be
+analyzed after the fact without replaying it. Every SnapshotManager writes
+its snaps under its own key, so a file can hold the snaps of several setts:
+
+    store = SnapStore("snaps.db", "native.solidex")
+    store.series("sett.pricePerFullShare", start, end)
+    store.balances("user", "want")
+    store.export_csv("snaps.csv")
+
+Values are stored as JSON text, as uint256 values don't fit SQLite integers.
+A SnapStore can also back a SnapHistory as its spill, the history then
+reading evicted snaps back from the store instead of writing them again.
+"""
+
+import csv
+import json
+import sqlite3
+
+from helpers.snapshot.snap import Snap
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snaps (
+    sett TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    entityKeys TEXT NOT NULL,
+    missing TEXT NOT NULL,
+    PRIMARY KEY (sett, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    sett TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (sett, block, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_key ON entries (sett, key, block);
+"""
+
+
+def between(start, end):
+    """
+    SQL condition and params restricting block to [start, end]
+    """
+    return (
+        "block BETWEEN ? AND ?",
+        [-1 if start is None else start, 2**63 - 1 if end is None else end],
+    )
+
+
+def to_cell(value):
+    # Full precision in CSV and Parquet, whatever the reader's integer width
+    return (
+        str(value) if isinstance(value, int) and not isinstance(value, bool) else value
+    )
+
+
+class SnapStore:
+    """
+    Snaps of one sett, sett being the key of the SnapshotManager taking them
+    """
+
+    def __init__(self, path, sett):
+        self.path = path
+        self.sett = sett
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def __contains__(self, block):
+        return (
+            self.db.execute(
+                "SELECT 1 FROM snaps WHERE sett = ? AND block = ?", [self.sett, block]
+            ).fetchone()
+            is not None
+        )
+
+    def __len__(self):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM snaps WHERE sett = ?", [self.sett]
+        ).fetchone()[0]
+
+    def setts(self):
+        """
+        Setts with snaps in the file, for a SnapStore of each
+        """
+        return [sett for sett, in self.db.execute("SELECT DISTINCT sett FROM snaps")]
+
+    def blocks(self, start=None, end=None):
+        condition, params = between(start, end)
+        return [
+            block
+            for block, in self.db.execute(
+                "SELECT block FROM snaps WHERE sett = ? AND {} "
+                "ORDER BY block".format(condition),
+                [self.sett, *params],
+            )
+        ]
+
+    def keys(self):
+        return [
+            key
+            for key, in self.db.execute(
+                "SELECT DISTINCT key FROM entries WHERE sett = ? ORDER BY key",
+                [self.sett],
+            )
+        ]
+
+    # ===== Snaps =====
+
+    def put(self, snap):
+        """
+        Stores the snap, replacing any earlier snap of the sett at its block
+        """
+        with self.db:
+            self.db.execute(
+                "DELETE FROM entries WHERE sett = ? AND block = ?",
+                [self.sett, snap.block],
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO snaps VALUES (?, ?, ?, ?)",
+                [
+                    self.sett,
+                    snap.block,
+                    json.dumps(list(snap.entityKeys)),
+                    json.dumps(sorted(snap.missing)),
+                ],
+            )
+            self.db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                [
+                    (self.sett, snap.block, key, json.dumps(value))
+                    for key, value in snap.data.items()
+                ],
+            )
+
+    def get(self, block):
+        row = self.db.execute(
+            "SELECT entityKeys, missing FROM snaps WHERE sett = ? AND block = ?",
+            [self.sett, block],
+        ).fetchone()
+        if row is None:
+            raise KeyError(block)
+        data = {
+            key: json.loads(value)
+            for key, value in self.db.execute(
+                "SELECT key, value FROM entries WHERE sett = ? AND block = ?",
+                [self.sett, block],
+            )
+        }
+        return Snap.load(
+            {
+                "block": block,
+                "data": data,
+                "entityKeys": json.loads(row[0]),
+                "missing": json.loads(row[1]),
+            }
+        )
+
+    def remove(self, block):
+        with self.db:
+            for table in ("entries", "snaps"):
+                self.db.execute(
+                    "DELETE FROM {} WHERE sett = ? AND block = ?".format(table),
+                    [self.sett, block],
+                )
+
+    def close(self):
+        self.db.close()
+
+    # ===== Queries =====
+
+    def series(self, key, start=None, end=None):
+        """
+        [(block, value)] of a key over the blocks in [start, end], e.g. the
+        pricePerFullShare over a range with "sett.pricePerFullShare"
+        """
+        condition, params = between(start, end)
+        return [
+            (block, json.loads(value))
+            for block, value in self.db.execute(
+                "SELECT block, value FROM entries WHERE sett = ? AND key = ? "
+                "AND {} ORDER BY block".format(condition),
+                [self.sett, key, *params],
+            )
+        ]
+
+    def prefix(self, prefix, start=None, end=None):
+        """
+        {block: {key: value}} of the keys starting with prefix
+        """
+        condition, params = between(start, end)
+        # Range scan on the (key, block) index instead of a LIKE
+        rows = self.db.execute(
+            "SELECT block, key, value FROM entries WHERE sett = ? AND key >= ? "
+            "AND key < ? AND {} ORDER BY block".format(condition),
+            [self.sett, prefix, prefix + "\uffff", *params],
+        )
+        result = {}
+        for block, key, value in rows:
+            result.setdefault(block, {})[key] = json.loads(value)
+        return result
+
+    def balances(self, accountKey, tokenKey=None, start=None, end=None):
+        """
+        [(block, balance)] of an entity for a token, or {block: {tokenKey:
+        balance}} over every token when tokenKey is None
+        """
+        if tokenKey is not None:
+            return self.series("balances." + tokenKey + "." + accountKey, start, end)
+        suffix = "." + accountKey
+        return {
+            block: {
+                key[len("balances.") : -len(suffix)]: value
+                for key, value in entries.items()
+                if key.endswith(suffix)
+            }
+            for block, entries in self.prefix("balances.", start, end).items()
+        }
+
+    # ===== Export =====
+
+    def rows(self, keys=None, start=None, end=None):
+        """
+        Header and one row per block, a column per key, None where a block
+        lacks the key
+        """
+        keys = keys or self.keys()
+        index = {key: i for i, key in enumerate(keys)}
+        condition, params = between(start, end)
+        yield ["block", *keys]
+
+        row = None
+        block = None
+        for entryBlock, key, value in self.db.execute(
+            "SELECT block, key, value FROM entries WHERE sett = ? AND {} "
+            "ORDER BY block".format(condition),
+            [self.sett, *params],
+        ):
+            if entryBlock != block:
+                if row is not None:
+                    yield [block, *row]
+                block = entryBlock
+                row = [None] * len(keys)
+            if key in index:
+                row[index[key]] = to_cell(json.loads(value))
+        if row is not None:
+            yield [block, *row]
+
+    def export_csv(self, path, keys=None, start=None, end=None):
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(self.rows(keys, start, end))
+
+    def export_parquet(self, path, keys=None, start=None, end=None):
+        """
+        Same wide layout as export_csv as a Parquet file, needs pyarrow.
+        Values are written as strings, keeping uint256 values exact
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = self.rows(keys, start, end)
+        header = next(rows)
+        columns = list(zip(*rows)) or [[] for _ in header]
+        table = pa.table(
+            {
+                name: pa.array(
+                    (
+                        column
+                        if name == "block"
+                        else [cell if cell is None else str(cell) for cell in column]
+                    ),
+                    pa.int64() if name == "block" else pa.string(),
+                )
+                for name, column in zip(header, columns)
+            }
+        )
+        pq.write_table(table, path)
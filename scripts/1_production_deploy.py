@@ -13,6 +13,7 @@ from brownie import (
 from config import WANT, PROTECTED_TOKENS, FEES, REGISTRY
 
 from helpers.constants import AddressZero
+from helpers.provider import install
 
 import click
 from rich.console import Console
@@ -30,6 +31,7 @@ def main():
     the setup and production tests are simpler and more efficient. The rest of the permissioned actors
     are set based on the latest entries from the Badger Registry.
     """
+    install()
 
     # Get deployer account from local keystore
     dev = connect_account()
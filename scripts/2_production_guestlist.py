@@ -12,6 +12,7 @@ from brownie import (
 from config import REGISTRY
 
 from helpers.constants import AddressZero
+from helpers.provider import install
 
 import click
 from rich.console import Console
@@ -29,6 +30,7 @@ def main():
     IMPORTANT: Must input the desired vault address to add the guestlist to as well as the
     different guestlist parameters below.
     """
+    install()
 
     # NOTE: Input your vault address and guestlist parameters below:
     vaultAddr = "0x1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a1a"
@@ -5,6 +5,7 @@ from brownie import accounts, network, MyStrategy, SettV4, BadgerRegistry
 from config import WANT, REWARD_TOKEN, LP_COMPONENT, REGISTRY
 
 from helpers.constants import AddressZero
+from helpers.provider import install
 
 import click
 from rich.console import Console
@@ -29,6 +30,7 @@ def main():
     this will effectively relinquish the contract control from your account to the Badger Governance.
     Additionally, the script performs a final check of all parameters against the registry parameters.
     """
+    install()
 
     # Get deployer account from local keystore
     dev = connect_account()
@@ -13,6 +13,7 @@ from rich.console import Console
 from config import REGISTRY
 
 from helpers.constants import AddressZero
+from helpers.provider import install
 
 console = Console()
 
@@ -27,6 +28,7 @@ def main():
     This script is enabled to handle multiple sets of strategy + vault + want. It must be
     called from the controller's governance account.
     """
+    install()
 
     # dev must be the controller's governance (get from keystore)
     dev = connect_account()
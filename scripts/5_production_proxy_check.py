@@ -1,10 +1,15 @@
-from brownie import network, BadgerRegistry, Controller, SettV4, web3
+from brownie import network, BadgerRegistry, Controller, SettV4
 from config import REGISTRY
 from helpers.constants import AddressZero
+from helpers.provider import install
+from helpers.multicall import Call, EndpointPool, RpcBatch, func
 from rich.console import Console
 
 console = Console()
 
+# Spread the batches across RPC_ENDPOINTS when set, see EndpointPool.from_env
+ENDPOINTS = EndpointPool.from_env()
+
 ADMIN_SLOT = int(0xB53127684A568B3173AE13B9F8A6016E243E63B6E8EE1178D6A717850B5D6103)
 
 
@@ -21,6 +26,7 @@ def main():
 
     4. Run the script and review the console output.
     """
+    install()
 
     console.print("You are using the", network.show_active(), "network")
 
@@ -64,15 +70,45 @@ def main():
     check_proxy_admin_owners(proxyAdminOwners, registry)
 
 
+def get_registry_keys(registry, keys):
+    # Resolve all registry keys in a single JSON-RPC batch
+    batch = RpcBatch(endpoints=ENDPOINTS)
+    for key in keys:
+        # NB: func.registry.get would resolve to DotMap.get
+        batch.call(Call(registry.address, [func.registry["get"], key], [[key, None]]))
+    return batch()
+
+
+def get_slot_addresses(contracts, slot):
+    # Read the same storage slot of all contracts in a single JSON-RPC batch,
+    # along with the error of each read that failed
+    batch = RpcBatch(endpoints=ENDPOINTS, allow_failure=True)
+    for key, address in contracts.items():
+        batch.get_storage_at(key, address, slot)
+    addresses = {key: "0x" + val.hex()[26:66] for key, val in batch().items()}
+    return addresses, batch.errors
+
+
+def check_proxy_admins(proxies, proxyAdmin):
+    admins, errors = get_slot_addresses(proxies, ADMIN_SLOT)
+    for key in proxies:
+        if key in errors:
+            print("Something went wrong")
+            print(errors[key])
+            continue
+        check_proxy_admin(admins[key], proxyAdmin, key)
+
+
 def check_by_keys(registry, proxyAdmin, keys):
     console.print("[blue]Checking proxyAdmins by key...[/blue]")
-    # Check the proxyAdmin of the different proxy contracts
+    proxies = get_registry_keys(registry, keys)
     for key in keys:
-        proxy = registry.get(key)
-        if proxy == AddressZero:
+        if proxies[key] == AddressZero:
             console.print(key, ":[red] key doesn't exist on the registry![/red]")
-            continue
-        check_proxy_admin(proxy, proxyAdmin, key)
+            del proxies[key]
+
+    # Check the proxyAdmin of the different proxy contracts
+    check_proxy_admins(proxies, proxyAdmin)
 
 
 def check_vaults_and_strategies(registry, proxyAdmin, authors):
@@ -81,6 +117,7 @@ def check_vaults_and_strategies(registry, proxyAdmin, authors):
     vaultStatus = [0, 1, 2]
 
     vaults = []
+    vaultProxies = {}
     strategies = []
     stratNames = []
 
@@ -102,27 +139,20 @@ def check_vaults_and_strategies(registry, proxyAdmin, authors):
             controller = Controller.at(vaultContract.controller())
             strategies.append(controller.strategies(vaultContract.token()))
             stratNames.append(vaultContract.name().replace("Badger Sett ", "Strategy "))
-            # Check vault proxyAdmin
-
-            check_proxy_admin(vault, proxyAdmin, vaultContract.name())
-        except Exception as error:
-            print("Something went wrong")
-            print(error)
-
-    for strat in strategies:
-        try:
-            # Check strategies' proxyAdmin
-            check_proxy_admin(strat, proxyAdmin, stratNames[strategies.index(strat)])
+            vaultProxies[vaultContract.name()] = vault
         except Exception as error:
             print("Something went wrong")
             print(error)
 
+    # Check vaults' and strategies' proxyAdmin, reading all slots in one batch
+    proxies = dict(vaultProxies, **dict(zip(stratNames, strategies)))
+    check_proxy_admins(proxies, proxyAdmin)
 
-def check_proxy_admin(proxy, proxyAdmin, key):
-    # Get proxyAdmin address form the proxy's ADMIN_SLOT
-    val = web3.eth.getStorageAt(proxy, ADMIN_SLOT).hex()
-    address = "0x" + val[26:66]
 
+def check_proxy_admin(address, proxyAdmin, key):
+    """
+    Compares the address read from the proxy's ADMIN_SLOT with the proxyAdmin
+    """
     # Check differnt possible scenarios
     if address == AddressZero:
         console.print(key, ":[red] admin not found on slot (GnosisSafeProxy?)[/red]")
@@ -138,12 +168,21 @@ def check_proxy_admin(proxy, proxyAdmin, key):
 def check_proxy_admin_owners(proxyAdminOwners, registry):
     console.print("[blue]Checking proxyAdmins' owners...[/blue]")
 
+    entries = get_registry_keys(
+        registry, [key for adminOwnerPair in proxyAdminOwners for key in adminOwnerPair]
+    )
+    # Get proxyAdmins' owner addresses from slot 0
+    owners, errors = get_slot_addresses(
+        {pair[0]: entries[pair[0]] for pair in proxyAdminOwners}, 0
+    )
+
     for adminOwnerPair in proxyAdminOwners:
-        proxyAdmin = registry.get(adminOwnerPair[0])
-        owner = registry.get(adminOwnerPair[1])
-        # Get proxyAdmin's owner address from slot 0
-        val = web3.eth.getStorageAt(proxyAdmin, 0).hex()
-        address = "0x" + val[26:66]
+        if adminOwnerPair[0] in errors:
+            print("Something went wrong")
+            print(errors[adminOwnerPair[0]])
+            continue
+        owner = entries[adminOwnerPair[1]]
+        address = owners[adminOwnerPair[0]]
 
         # Check differnt possible scenarios
         if address == AddressZero:
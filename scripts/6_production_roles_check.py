@@ -1,6 +1,7 @@
 from brownie import network, BadgerRegistry, Controller, interface, web3
 from config import REGISTRY
 from helpers.constants import AddressZero
+from helpers.provider import install
 from rich.console import Console
 from tabulate import tabulate
 
@@ -30,6 +31,7 @@ def main():
 
     4. Run the script and analyze the printed results.
     """
+    install()
 
     console.print("You are using the", network.show_active(), "network")
 
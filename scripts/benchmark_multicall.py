@@ -0,0 +1,137 @@
+import time
+
+from eth_abi import decode_single, encode_single
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from helpers.multicall import Call, Multicall, func, as_wei
+from helpers.multicall.signature import parse_signature
+from rich.console import Console
+from tabulate import tabulate
+
+console = Console()
+
+# Roughly the shape of one SnapshotManager.snap: a handful of tokens times
+# the tracked entities, plus the sett and strategy views
+TOKENS = 4
+ENTITIES = 12
+ROUNDS = 200
+# Size of the snapshot used for the decoding benchmark
+DECODE_CALLS = 1000
+DECODE_ROUNDS = 20
+
+
+def main():
+    """
+    Microbenchmark for building multicall plans. Runs offline, e.g.
+    brownie run benchmark_multicall --network development
+    """
+    results = [
+        ["baseline Call() code path", bench_build_calls(cold=True)],
+        ["Call() (interned signatures)", bench_build_calls(cold=False)],
+    ]
+
+    console.print("[green]=== Multicall plan building ===[/green]")
+    print(
+        tabulate(
+            [[name, "{:,.0f}".format(rate)] for name, rate in results],
+            headers=["benchmark", "calls/s"],
+        )
+    )
+    console.print("Speedup: {:.1f}x".format(results[1][1] / results[0][1]))
+
+    results = [
+        ["eth_abi decode_single", bench_decode(fast=False)],
+        ["fixed-width fast path", bench_decode(fast=True)],
+    ]
+
+    console.print(
+        "[green]=== Decoding a {:,}-call aggregate ===[/green]".format(DECODE_CALLS)
+    )
+    print(
+        tabulate(
+            [[name, "{:,.0f}".format(rate)] for name, rate in results],
+            headers=["benchmark", "calls/s"],
+        )
+    )
+    console.print("Speedup: {:.1f}x".format(results[1][1] / results[0][1]))
+
+
+def baseline_call(target, function, returns):
+    """
+    What building a Call and encoding its calldata cost before: checksumming
+    the target, compiling the signature and encoding through eth_abi, for
+    every call
+    """
+    to_checksum_address(target)
+    name, *args = function
+    parts = parse_signature(name)
+    selector = function_signature_to_4byte_selector("".join(parts[:2]))
+    return selector + encode_single(parts[1], args) if args else selector
+
+
+def build_snap_calls(cold=False):
+    make = baseline_call if cold else Call
+    calls = []
+    for t in range(TOKENS):
+        token = "0x" + "{:040x}".format(t + 1)
+        for e in range(ENTITIES):
+            entity = "0x" + "{:040x}".format(0xE000 + e)
+            calls.append(
+                make(
+                    token,
+                    [func.erc20.balanceOf, entity],
+                    [["balances.{}.{}".format(t, e), as_wei]],
+                )
+            )
+    for name in ["balanceOfPool", "balanceOfWant", "balanceOf", "withdrawalFee"]:
+        calls.append(
+            make(
+                "0x" + "ff" * 20,
+                [func.strategy[name]],
+                [["strategy." + name, as_wei]],
+            )
+        )
+    return calls
+
+
+def bench_build_calls(cold):
+    built = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        # Calls encode their calldata when built
+        built += len(build_snap_calls(cold))
+    return built / (time.perf_counter() - start)
+
+
+def bench_decode(fast):
+    calls = [
+        Call(
+            "0x" + "{:040x}".format(i + 1),
+            [func.erc20.balanceOf, "0x" + "ee" * 20],
+            [["balances.{}".format(i), as_wei]],
+        )
+        for i in range(DECODE_CALLS)
+    ]
+    response = encode_single(
+        "(uint256,bytes[])",
+        [1, [encode_single("(uint256)", [i * 10**18]) for i in range(DECODE_CALLS)]],
+    )
+    multi = Multicall(calls)
+
+    start = time.perf_counter()
+    for _ in range(DECODE_ROUNDS):
+        if fast:
+            _, outputs = multi.unpack(response)
+            result = multi.decode(outputs)
+        else:
+            # What every call went through before: eth_abi for the aggregate
+            # response and again for each call's return data
+            _, outputs = decode_single("(uint256,bytes[])", response)
+            result = {}
+            for call, output in zip(calls, outputs):
+                result.update(
+                    call.format_output(
+                        decode_single(call.signature.output_types, output)
+                    )
+                )
+    assert len(result) == DECODE_CALLS
+    return DECODE_CALLS * DECODE_ROUNDS / (time.perf_counter() - start)
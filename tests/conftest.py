@@ -10,12 +10,74 @@ from config import (
     FEES,
 )
 from dotmap import DotMap
+from helpers import cassette
+import os
 import pytest
 from rich.console import Console
 
 console = Console()
 
 
+def pytest_configure(config):
+    """
+    Opt-in record/replay of the fork's upstream reads, see helpers/cassette.py:
+    RPC_CASSETTE=tests/ftm.cassette brownie test [--network ftm-main-fork]
+
+    Replays when the cassette exists and records it otherwise, unless
+    RPC_CASSETTE_MODE says so. RPC_CASSETTE_BLOCK pins the fork block
+    """
+    path = os.getenv("RPC_CASSETTE")
+    if not path:
+        return
+    from brownie._config import CONFIG
+
+    network = (
+        config.getoption("network", default=None)
+        or CONFIG.settings["networks"]["default"]
+    )
+    settings = CONFIG.networks[network]["cmd_settings"]
+    upstream = settings["fork"]
+    if upstream in CONFIG.networks:
+        upstream = CONFIG.networks[upstream]["host"]
+    mode = os.getenv("RPC_CASSETTE_MODE") or (
+        cassette.REPLAY if os.path.exists(path) else cassette.RECORD
+    )
+    block = os.getenv("RPC_CASSETTE_BLOCK")
+
+    server = cassette.start(
+        path, mode, os.path.expandvars(upstream), int(block) if block else None
+    )
+    # The fork now reads upstream state through the stand-in server
+    settings["fork"] = server.uri + ("@" + block if block else "")
+    config.cassette = server
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    server = getattr(config, "cassette", None)
+    if server is None:
+        return
+    recording = server.cassette
+    terminalreporter.write_sep(
+        "=",
+        "RPC cassette ({}): {} hits, {} misses".format(
+            server.mode, recording.hits, len(recording.misses)
+        ),
+    )
+    if server.mode == cassette.REPLAY and recording.misses:
+        for method, params in recording.misses[:20]:
+            terminalreporter.write_line("miss: {} {}".format(method, params))
+        terminalreporter.write_line(
+            "The cassette is stale, re-record it with RPC_CASSETTE_MODE=record"
+        )
+
+
+def pytest_unconfigure(config):
+    server = getattr(config, "cassette", None)
+    if server is not None:
+        server.cassette.save()
+        server.shutdown()
+
+
 @pytest.fixture(autouse=True)
 def isolation(fn_isolation):
     pass
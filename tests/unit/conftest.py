@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from eth_abi import decode_single, encode_single
+from eth_utils import function_signature_to_4byte_selector
+from hexbytes import HexBytes
+
+from helpers.multicall import EndpointPool
+
+AGGREGATE = function_signature_to_4byte_selector("aggregate((address,bytes)[])")
+TRY_BLOCK_AND_AGGREGATE = function_signature_to_4byte_selector(
+    "tryBlockAndAggregate(bool,(address,bytes)[])"
+)
+
+
+class RpcError(ValueError):
+    """
+    JSON-RPC error with a code other than the generic -32000
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class Node(ThreadingHTTPServer):
+    """
+    Local stand-in JSON-RPC node. answer(request) returns the result of a
+    request, or raises ValueError for a JSON-RPC error
+    """
+
+    daemon_threads = True
+
+    def __init__(self, answer, delay=0, status=200, batches=True):
+        super().__init__(("127.0.0.1", 0), NodeHandler)
+        self.answer = answer
+        # Seconds before answering, or a function of the request body
+        self.delay = delay
+        self.status = status
+        # Without batch support, a batch is answered with a single error
+        self.batches = batches
+        self.requests = []
+
+    @property
+    def uri(self):
+        return "http://127.0.0.1:{}".format(self.server_port)
+
+    def respond(self, request):
+        try:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "result": self.answer(request),
+            }
+        except ValueError as error:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "error": {
+                    "code": getattr(error, "code", -32000),
+                    "message": str(error),
+                },
+            }
+
+
+class Chain:
+    """
+    Stand-in chain, with Fantom's id so its aggregator deployments are known.
+    views maps (target, calldata) to return data, other calls revert
+    """
+
+    def __init__(self, block=100):
+        self.views = {}
+        self.block = block
+        self.hash = "0x" + "ab" * 32
+        # Without them, aggregate calls return no data like any address
+        # without code, e.g. at blocks before their deployment
+        self.aggregators = True
+        # As ganache-cli 6, run eth_call in a child block of the one read
+        self.child_block = False
+        # Aggregates of more calls run out of gas
+        self.max_calls = None
+        # (code, message) of an error answered to every aggregate
+        self.error = None
+        # Params of every eth_call
+        self.calls = []
+        # Number of calls in every aggregate
+        self.sizes = []
+
+    def view(self, target, calldata):
+        key = (target.lower(), bytes(calldata))
+        if key not in self.views:
+            raise ValueError("execution reverted")
+        return self.views[key]
+
+    def set(self, call, output):
+        self.views[(call.target.lower(), bytes(call.data))] = output
+
+    def aggregate(self, calls):
+        self.sizes.append(len(calls))
+        if self.error is not None:
+            raise RpcError(*self.error)
+        if self.max_calls is not None and len(calls) > self.max_calls:
+            raise ValueError("out of gas")
+
+    def call_block(self):
+        return self.block + 1 if self.child_block else self.block
+
+    def answer(self, request):
+        method, params = request["method"], request["params"]
+        if method == "eth_chainId":
+            return "0xfa"
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        if method == "eth_getBlockByNumber":
+            return {"number": hex(self.block), "hash": self.hash}
+        if method != "eth_call":
+            raise ValueError("unsupported method " + method)
+
+        self.calls.append(params)
+        data = HexBytes(params[0]["data"])
+        if not self.aggregators and data[:4] in (AGGREGATE, TRY_BLOCK_AND_AGGREGATE):
+            output = b""
+        elif data[:4] == AGGREGATE:
+            (calls,) = decode_single("((address,bytes)[])", data[4:])
+            self.aggregate(calls)
+            output = encode_single(
+                "(uint256,bytes[])",
+                [
+                    self.call_block(),
+                    [self.view(target, calldata) for target, calldata in calls],
+                ],
+            )
+        elif data[:4] == TRY_BLOCK_AND_AGGREGATE:
+            _, calls = decode_single("(bool,(address,bytes)[])", data[4:])
+            self.aggregate(calls)
+            results = []
+            for target, calldata in calls:
+                try:
+                    results.append((True, self.view(target, calldata)))
+                except ValueError:
+                    results.append((False, b""))
+            output = encode_single(
+                "(uint256,bytes32,(bool,bytes)[])",
+                [self.call_block(), bytes(32), results],
+            )
+        else:
+            output = self.view(params[0]["to"], data)
+        return "0x" + output.hex()
+
+
+class NodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Keep-alive responses otherwise wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        delay = self.server.delay
+        time.sleep(delay(body) if callable(delay) else delay)
+        if isinstance(body, list) and not self.server.batches:
+            response = {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": -32600, "message": "batch requests not supported"},
+            }
+        elif isinstance(body, list):
+            response = [self.server.respond(request) for request in body]
+        else:
+            response = self.server.respond(body)
+        payload = json.dumps(response).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def node():
+    """
+    Starts stand-in nodes, node(answer, delay=0, status=200)
+    """
+    nodes = []
+
+    def start(answer, **kwargs):
+        server = Node(answer, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        nodes.append(server)
+        return server
+
+    yield start
+    for server in nodes:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def chain(node):
+    """
+    Stand-in chain served by a local node, chain.server, through the
+    EndpointPool chain.pool
+    """
+    chain = Chain()
+    chain.server = node(chain.answer)
+    chain.pool = EndpointPool([chain.server.uri])
+    return chain
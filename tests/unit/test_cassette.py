@@ -0,0 +1,117 @@
+import pytest
+import requests
+
+from helpers import cassette
+
+
+class RateLimited(ValueError):
+    code = -32005
+
+
+def balance(request):
+    address, block = request["params"]
+    if address == "0xbad":
+        raise ValueError("invalid address")
+    if address == "0xbusy":
+        raise RateLimited("daily request count exceeded")
+    return "0x" + address[-2:]
+
+
+def rpc(server, method, params, id=1):
+    return requests.post(
+        server.uri,
+        json={"jsonrpc": "2.0", "id": id, "method": method, "params": params},
+    ).json()
+
+
+@pytest.fixture
+def serve():
+    """
+    Starts cassette servers, serve(path, mode, upstream)
+    """
+    servers = []
+
+    def start(*args, **kwargs):
+        server = cassette.start(*args, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_record_then_replay(node, serve, tmp_path):
+    path = str(tmp_path / "fork.cassette")
+    upstream = node(balance)
+    recorder = serve(path, cassette.RECORD, upstream.uri, block=100)
+
+    assert rpc(recorder, "eth_getBalance", ["0x01", "0x64"])["result"] == "0x01"
+    # Upstream errors are part of the recording
+    assert rpc(recorder, "eth_getBalance", ["0xbad", "0x64"])["error"]["message"] == (
+        "invalid address"
+    )
+    # Answered from the cassette
+    assert rpc(recorder, "eth_getBalance", ["0x01", "0x64"], id=2)["id"] == 2
+    assert len(upstream.requests) == 2
+    recorder.cassette.save()
+
+    player = serve(path)
+    assert player.cassette.block == 100
+    response = requests.post(
+        player.uri,
+        json=[
+            {"jsonrpc": "2.0", "id": 7, "method": "eth_getBalance", "params": p}
+            for p in [["0x01", "0x64"], ["0xbad", "0x64"]]
+        ],
+    ).json()
+    assert response[0] == {"jsonrpc": "2.0", "id": 7, "result": "0x01"}
+    assert response[1]["error"]["message"] == "invalid address"
+    assert player.cassette.hits == 2
+    assert not player.cassette.misses
+    assert len(upstream.requests) == 2
+
+
+def test_replay_miss(serve, tmp_path):
+    player = serve(str(tmp_path / "empty.cassette"))
+    response = rpc(player, "eth_getCode", ["0x02", "0x64"])
+
+    assert response["error"]["code"] == cassette.MISS_ERROR
+    assert player.cassette.misses == [("eth_getCode", ["0x02", "0x64"])]
+
+
+def test_record_upstream_failure(node, serve, tmp_path):
+    upstream = node(balance, status=502)
+    recorder = serve(str(tmp_path / "fork.cassette"), cassette.RECORD, upstream.uri)
+
+    response = rpc(recorder, "eth_getBalance", ["0x01", "0x64"])
+    assert response["error"]["code"] == cassette.UPSTREAM_ERROR
+    assert not recorder.cassette.entries
+
+    # Retried upstream once it recovers
+    upstream.status = 200
+    assert rpc(recorder, "eth_getBalance", ["0x01", "0x64"])["result"] == "0x01"
+    assert len(recorder.cassette.entries) == 1
+
+
+def test_transient_errors_not_recorded(node, serve, tmp_path):
+    upstream = node(balance)
+    recorder = serve(str(tmp_path / "fork.cassette"), cassette.RECORD, upstream.uri)
+
+    response = rpc(recorder, "eth_getBalance", ["0xbusy", "0x64"])
+    assert response["error"]["code"] == cassette.UPSTREAM_ERROR
+    assert not recorder.cassette.entries
+    assert cassette.is_transient({"code": -32603, "message": "internal error"})
+    assert cassette.is_transient({"code": -32000, "message": "Rate limit reached"})
+    assert not cassette.is_transient({"code": 3, "message": "execution reverted"})
+
+
+def test_record_upstream_down(node, serve, tmp_path):
+    upstream = node(balance)
+    upstream.shutdown()
+    upstream.server_close()
+    recorder = serve(str(tmp_path / "fork.cassette"), cassette.RECORD, upstream.uri)
+
+    response = rpc(recorder, "eth_getBalance", ["0x01", "0x64"])
+    assert response["error"]["code"] == cassette.UPSTREAM_ERROR
@@ -0,0 +1,131 @@
+"""
+The hand-rolled codecs against eth_abi
+"""
+
+import pytest
+from eth_abi import decode_single, encode_single
+from eth_abi.exceptions import DecodingError, EncodingError
+
+from helpers.multicall.multicall import decode_aggregate, decode_try_aggregate
+from helpers.multicall.signature import Signature
+
+ADDRESS = "0x" + "c0ffee" * 6 + "beef"
+
+
+@pytest.mark.parametrize(
+    "types,values",
+    [
+        ("(uint256)", [2**256 - 1]),
+        ("(uint8,uint128)", [255, 2**100]),
+        ("(int256)", [-1]),
+        ("(int256,int24)", [-(2**255), -8388608]),
+        ("(int128)", [2**127 - 1]),
+        ("(bool,bool)", [True, False]),
+        ("(address)", [ADDRESS]),
+        ("(bytes32,bytes4,bytes1)", [b"\x01" * 32, b"\xde\xad\xbe\xef", b"\xff"]),
+        (
+            "(uint256,int256,bool,address,bytes8)",
+            [10**18, -(10**18), True, ADDRESS, b"12345678"],
+        ),
+    ],
+)
+def test_fixed_decoders(types, values):
+    signature = Signature("view()" + types)
+    output = encode_single(types, values)
+
+    assert signature.fixed
+    assert signature.decode_data(output) == decode_single(types, output)
+
+
+def test_fixed_decoders_short_output():
+    with pytest.raises(DecodingError):
+        Signature("view()(uint256,uint256)").decode_data(bytes(32))
+
+
+@pytest.mark.parametrize(
+    "types,values",
+    [
+        ("(address)", [ADDRESS]),
+        ("(address,uint256)", [ADDRESS, 2**256 - 1]),
+        ("(bool,address,uint256)", [True, ADDRESS, 0]),
+    ],
+)
+def test_fixed_encoders(types, values):
+    signature = Signature("call" + types + "()")
+
+    assert signature.fixed_inputs
+    assert signature.encode_data(values) == signature.fourbyte + encode_single(
+        types, values
+    )
+
+
+@pytest.mark.parametrize(
+    "types,value",
+    [
+        ("(uint256)", "1"),
+        ("(uint256)", 1.0),
+        ("(uint256)", True),
+        ("(uint256)", -1),
+        ("(uint256)", 2**256),
+        ("(bool)", 1),
+        ("(bool)", "true"),
+    ],
+)
+def test_fixed_encoders_reject(types, value):
+    signature = Signature("call" + types + "()")
+
+    assert signature.fixed_inputs
+    with pytest.raises(EncodingError):
+        signature.encode_data([value])
+    with pytest.raises(EncodingError):
+        encode_single(types, [value])
+
+
+OUTPUTS = [b"", bytes(32), b"\x01" * 33, b"\xab" * 100, encode_single("uint256", 7)]
+
+
+def test_decode_aggregate():
+    output = encode_single("(uint256,bytes[])", [123, OUTPUTS])
+    block, outputs = decode_aggregate(output)
+
+    assert (block, tuple(bytes(data) for data in outputs)) == decode_single(
+        "(uint256,bytes[])", output
+    )
+
+
+def test_decode_try_aggregate():
+    results = [(True, data) for data in OUTPUTS] + [(False, b""), (False, b"\x08")]
+    output = encode_single(
+        "(uint256,bytes32,(bool,bytes)[])", [123, b"\xff" * 32, results]
+    )
+    block, outputs = decode_try_aggregate(output)
+    expected = decode_single("(uint256,bytes32,(bool,bytes)[])", output)
+
+    assert block == expected[0]
+    assert [(success, bytes(data)) for success, data in outputs] == list(expected[2])
+
+
+def test_decode_empty_aggregate():
+    assert decode_aggregate(encode_single("(uint256,bytes[])", [5, []])) == (5, [])
+
+
+def test_decode_truncated_aggregate():
+    output = encode_single("(uint256,bytes[])", [123, [b"\xab" * 100]])
+
+    with pytest.raises(DecodingError):
+        decode_aggregate(output[:-64])
+
+
+@pytest.mark.parametrize("decode", [decode_aggregate, decode_try_aggregate])
+def test_decode_empty_response(decode):
+    with pytest.raises(DecodingError):
+        decode(b"")
+
+
+def test_decode_offset_out_of_bounds():
+    output = bytearray(encode_single("(uint256,bytes[])", [123, [b"\xab"]]))
+    # Array offset past the end of the response
+    output[32:64] = (len(output) + 32).to_bytes(32, "big")
+
+    with pytest.raises(DecodingError):
+        decode_aggregate(bytes(output))
@@ -0,0 +1,129 @@
+import pytest
+
+from helpers.multicall import Call, func
+from helpers.multicall.address import to_address
+from helpers.snapshot.delta import (
+    FULL,
+    TRANSFER_TOPIC,
+    VERIFY,
+    balance_keys,
+    derive,
+    mismatches,
+    snap_mode,
+    transfers,
+)
+from helpers.snapshot.snap import Snap
+
+WANT = to_address("0x" + "aa" * 20)
+SETT = to_address("0x" + "bb" * 20)
+USER = to_address("0x" + "01" * 20)
+ZERO = to_address("0x" + "00" * 20)
+
+
+def topic(address):
+    return "0x" + "00" * 12 + address[2:]
+
+
+def transfer(token, sender, receiver, amount):
+    return {
+        "address": token,
+        "topics": [TRANSFER_TOPIC.hex(), topic(sender), topic(receiver)],
+        "data": "0x" + "{:064x}".format(amount),
+    }
+
+
+def balance(token, holder, key):
+    return Call(token, [func.erc20.balanceOf, holder], [[key, None]])
+
+
+CALLS = [
+    balance(WANT, USER, "balances.want.user"),
+    balance(WANT, SETT, "balances.want.sett"),
+    balance(SETT, USER, "balances.sett.user"),
+    Call(SETT, [func.sett.getPricePerFullShare], [["sett.pricePerFullShare", None]]),
+]
+
+
+def before(**values):
+    data = {
+        "balances.want.user": 100,
+        "balances.want.sett": 50,
+        "balances.sett.user": 0,
+        "sett.pricePerFullShare": 10**18,
+    }
+    data.update(values)
+    return Snap(data, 9, ["user", "sett"])
+
+
+def test_transfers():
+    logs = [
+        transfer(WANT, USER, SETT, 30),
+        # ERC721, the token id is indexed
+        dict(transfer(WANT, USER, SETT, 0), topics=[TRANSFER_TOPIC.hex()] * 4),
+        # Other event
+        dict(transfer(WANT, USER, SETT, 1), topics=["0x" + "11" * 32] * 3),
+    ]
+
+    assert list(transfers(logs)) == [(WANT, USER, SETT, 30)]
+
+
+def test_deposit():
+    logs = [transfer(WANT, USER, SETT, 30), transfer(SETT, ZERO, USER, 29)]
+    derived, reads = derive(before(), CALLS, logs)
+
+    assert derived == {
+        "balances.want.user": 70,
+        "balances.want.sett": 80,
+        "balances.sett.user": 29,
+    }
+    assert reads == CALLS[3:]
+
+
+def test_withdraw_burns():
+    logs = [transfer(SETT, USER, ZERO, 10), transfer(WANT, SETT, USER, 11)]
+    derived, _ = derive(before(**{"balances.sett.user": 10}), CALLS, logs)
+
+    assert derived["balances.sett.user"] == 0
+    assert derived["balances.want.user"] == 111
+    assert derived["balances.want.sett"] == 39
+
+
+def test_holder_tracked_twice():
+    calls = CALLS + [balance(WANT, USER, "balances.want.governance")]
+    snap = before(**{"balances.want.governance": 100})
+
+    assert balance_keys(calls)[(WANT, USER)] == [
+        "balances.want.user",
+        "balances.want.governance",
+    ]
+    derived, reads = derive(snap, calls, [transfer(WANT, USER, SETT, 30)])
+    assert derived["balances.want.user"] == derived["balances.want.governance"] == 70
+    assert reads == CALLS[3:]
+
+
+def test_failed_before_value_is_read():
+    derived, reads = derive(
+        before(**{"balances.want.user": None}),
+        CALLS,
+        [transfer(WANT, USER, SETT, 30)],
+    )
+
+    assert "balances.want.user" not in derived
+    assert derived["balances.want.sett"] == 80
+    assert reads == [CALLS[0], CALLS[3]]
+
+
+def test_mismatches():
+    derived = Snap({"balances.want.user": 70, "balances.sett.user": 29}, 10, ["user"])
+    full = Snap({"balances.want.user": 70, "balances.sett.user": 30}, 10, ["user"])
+
+    assert mismatches(derived, full) == [("balances.sett.user", 29, 30)]
+    assert mismatches(derived, derived) == []
+
+
+def test_snap_mode():
+    assert snap_mode(FULL) == FULL
+    assert snap_mode(VERIFY) == VERIFY
+    for mode in ("Delta", "verfy", ""):
+        with pytest.raises(ValueError):
+            snap_mode(mode)
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+
+import pytest
+import requests
+
+from helpers.multicall import EndpointPool
+from helpers.multicall.endpoints import request_kind
+
+
+def block_number(request):
+    return "0x10"
+
+
+def test_weighted_pick(node):
+    random.seed(1)
+    heavy = node(block_number)
+    light = node(block_number)
+    pool = EndpointPool({heavy.uri: 3, light.uri: 1})
+
+    for _ in range(200):
+        assert pool.request("eth_blockNumber", []) == "0x10"
+    assert 120 < len(heavy.requests) < 180
+    assert 20 < len(light.requests) < 80
+
+
+def test_hedge_slow_request(node):
+    first = threading.Event()
+
+    def delay(body):
+        # Whichever endpoint gets the request first stalls
+        if first.is_set():
+            return 0
+        first.set()
+        return 3
+
+    nodes = [node(block_number, delay=delay) for _ in range(2)]
+    pool = EndpointPool([server.uri for server in nodes], hedge_delay=0.1)
+
+    started = time.monotonic()
+    assert pool.request("eth_blockNumber", []) == "0x10"
+    assert time.monotonic() - started < 2
+    assert [len(server.requests) for server in nodes] == [1, 1]
+
+
+def test_hedge_threshold_per_request_kind(node):
+    """
+    Fast eth_blockNumber samples don't get a large eth_call hedged
+    """
+    call = ["0x" + "00" * 10_000, "latest"]
+    nodes = [
+        node(
+            block_number,
+            delay=lambda body: 0.3 if body["method"] == "eth_call" else 0,
+        )
+        for _ in range(2)
+    ]
+    pool = EndpointPool([server.uri for server in nodes], hedge_delay=1)
+
+    for _ in range(30):
+        pool.request("eth_blockNumber", [])
+    for endpoint in pool.endpoints:
+        kind = request_kind({"method": "eth_blockNumber", "params": []})
+        assert pool.hedge_after(endpoint, kind) < 0.3
+
+    requests_before = sum(len(server.requests) for server in nodes)
+    pool.request("eth_call", call)
+    assert sum(len(server.requests) for server in nodes) == requests_before + 1
+
+
+def test_request_kind():
+    small = {"method": "eth_call", "params": ["0x00"]}
+    large = {"method": "eth_call", "params": ["0x" + "00" * 10_000]}
+
+    assert request_kind(small) != request_kind(large)
+    assert request_kind(small)[0] != request_kind({"method": "eth_chainId"})[0]
+    assert request_kind([small])[0] == "batch"
+
+
+def test_eject_failing_endpoint(node):
+    dead = node(block_number)
+    dead.shutdown()
+    dead.server_close()
+    live = node(block_number)
+    pool = EndpointPool([dead.uri, live.uri], max_failures=1, eject_seconds=60)
+
+    for _ in range(20):
+        assert pool.request("eth_blockNumber", []) == "0x10"
+    endpoint = next(endpoint for endpoint in pool.endpoints if endpoint.uri == dead.uri)
+    assert not endpoint.healthy()
+
+    # Requests skip the ejected endpoint
+    failures = endpoint.failures
+    for _ in range(20):
+        pool.request("eth_blockNumber", [])
+    assert endpoint.failures == failures
+    assert len(live.requests) == 40
+
+
+def test_all_endpoints_failing(node):
+    dead = node(block_number)
+    dead.shutdown()
+    dead.server_close()
+    pool = EndpointPool([dead.uri])
+
+    with pytest.raises(requests.ConnectionError):
+        pool.request("eth_blockNumber", [])
@@ -0,0 +1,91 @@
+from helpers.snapshot.history import SnapHistory, SpillFile
+from helpers.snapshot.snap import Snap
+
+
+def snap(block, timestamp=None):
+    data = {"sett.balance": block * 10}
+    if timestamp is not None:
+        data["block.timestamp"] = timestamp
+    return Snap(data, block, ["user"])
+
+
+def test_evict_by_count():
+    history = SnapHistory(maxSnaps=2)
+    for block in range(1, 5):
+        history[block] = snap(block)
+
+    assert list(history.snaps) == [3, 4]
+    assert history.spill.blocks() == [1, 2]
+    assert history.blocks() == [1, 2, 3, 4]
+
+
+def test_evict_by_age():
+    history = SnapHistory(maxAge=60)
+    history[1] = snap(1, timestamp=1000)
+    history[2] = snap(2, timestamp=1050)
+    history[3] = snap(3, timestamp=1100)
+    # Without a timestamp, never too old
+    history[4] = snap(4)
+
+    assert list(history.snaps) == [2, 3, 4]
+    assert history.spill.blocks() == [1]
+
+
+def test_pinned_snaps_stay_in_memory():
+    history = SnapHistory(maxSnaps=1)
+    history[1] = snap(1)
+    history.pin("start", 1)
+    history[2] = snap(2)
+    history[3] = snap(3)
+
+    assert list(history.snaps) == [1, 3]
+    assert history.named("start").data.to_dict() == {"sett.balance": 10}
+
+    history.unpin("start")
+    assert list(history.snaps) == [3]
+
+
+def test_pin_spilled_snap():
+    history = SnapHistory(maxSnaps=1)
+    history[1] = snap(1)
+    history[2] = snap(2)
+    history.pin("start", 1)
+
+    assert 1 in history.snaps
+    assert history.named("start").block == 1
+
+
+def test_reload_after_spill():
+    history = SnapHistory(maxSnaps=1)
+    history[1] = snap(1, timestamp=1000)
+    history[2] = snap(2)
+
+    reloaded = history[1]
+    assert 1 not in history.snaps
+    assert reloaded.block == 1
+    assert reloaded.dump() == snap(1, timestamp=1000).dump()
+
+
+def test_newer_snap_shadows_spilled_one():
+    history = SnapHistory(maxSnaps=1)
+    history[1] = snap(1)
+    history[2] = snap(2)
+    history[1] = Snap({"sett.balance": 11}, 1, ["user"])
+
+    assert history[1].data.to_dict() == {"sett.balance": 11}
+    assert history.spill.get(2).block == 2
+
+
+def test_spill_file_keeps_existing_content(tmp_path):
+    path = tmp_path / "spill.jsonl"
+    path.write_bytes(b"earlier run\n")
+
+    first = SnapHistory(maxSnaps=1, spill=SpillFile(str(path)))
+    second = SnapHistory(maxSnaps=1, spill=SpillFile(str(path)))
+    for block in (1, 2):
+        first[block] = snap(block)
+        second[block + 10] = snap(block + 10)
+
+    assert path.read_bytes().startswith(b"earlier run\n")
+    assert first[1].data.to_dict() == {"sett.balance": 10}
+    assert second[11].data.to_dict() == {"sett.balance": 110}
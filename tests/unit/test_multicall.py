@@ -0,0 +1,172 @@
+import pytest
+import requests
+from eth_abi import encode_single
+from eth_abi.exceptions import DecodingError
+
+from helpers.multicall import Call, Multicall, func
+from helpers.multicall.multicall import encoded_size, is_size_error
+from helpers.multicall.plan import CallPlan
+
+USER = "0x" + "22" * 20
+
+
+def balance_call(i, name):
+    return Call(
+        "0x" + "{:040x}".format(i + 1), [func.erc20.balanceOf, USER], [[name, None]]
+    )
+
+
+def balances(chain, names):
+    calls = []
+    for i, name in enumerate(names):
+        call = balance_call(i, name)
+        chain.set(call, encode_single("uint256", i + 1))
+        calls.append(call)
+    return calls
+
+
+def test_aggregate(chain):
+    calls = balances(chain, ["a", "b", "c"])
+    multi = Multicall(calls, endpoints=chain.pool)
+
+    assert multi() == {"a": 1, "b": 2, "c": 3}
+    assert multi.block == chain.block
+    assert len(chain.calls) == 1
+
+
+def test_chunks_keep_order(chain):
+    calls = balances(chain, ["a", "b", "c", "d", "e"])
+    multi = Multicall(
+        calls, endpoints=chain.pool, max_calldata=2 * encoded_size(calls[0])
+    )
+
+    assert list(multi().items()) == [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("e", 5)]
+    # Three chunks, all pinned to the block read up front
+    aggregates = [params for params in chain.calls if params[1] != "latest"]
+    assert len(aggregates) == 3
+    assert {params[1] for params in aggregates} == {hex(chain.block)}
+
+
+@pytest.mark.parametrize("allow_failure", [False, True])
+def test_size_error_halves_batch(chain, allow_failure):
+    calls = balances(chain, ["a", "b", "c", "d", "e"])
+    chain.max_calls = 2
+    multi = Multicall(calls, endpoints=chain.pool, allow_failure=allow_failure)
+
+    assert list(multi().items()) == [("a", 1), ("b", 2), ("c", 3), ("d", 4), ("e", 5)]
+    # 5 -> 2 + 3 -> 2 + 1 + 2, all at one block
+    assert len(chain.calls) == 5
+    assert {params[1] for params in chain.calls[1:]} == {hex(chain.block)}
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        (-32005, "limit exceeded"),
+        (429, "Too Many Requests"),
+        (-32000, "daily request rate limit exceeded"),
+        (3, "execution reverted: 0x413"),
+    ],
+)
+def test_other_errors_not_split(chain, error):
+    calls = balances(chain, ["a", "b", "c"])
+    chain.error = error
+    multi = Multicall(calls, endpoints=chain.pool)
+
+    with pytest.raises(ValueError):
+        multi()
+    assert len(chain.calls) == 1
+
+
+def test_payload_too_large():
+    response = requests.Response()
+    response.status_code = 413
+    assert is_size_error(requests.HTTPError(response=response))
+    response.status_code = 429
+    assert not is_size_error(requests.HTTPError("413", response=response))
+
+
+def test_try_aggregate_failed_call(chain):
+    calls = balances(chain, ["a", "b"])
+    calls.append(Call("0x" + "99" * 20, [func.erc20.totalSupply], [["bad", None]]))
+    multi = Multicall(calls, endpoints=chain.pool, allow_failure=True, columnar=True)
+    result = multi()
+
+    assert result.to_dict() == {"a": 1, "b": 2}
+    assert list(result.columns())[-1] == ("bad", None)
+    assert multi.missing == ["bad"]
+    assert multi.success == [True, True, False]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_shared_call_sent_once(chain, columnar):
+    """
+    A holder tracked under several keys is read once, every key gets the value
+    """
+    (a,) = balances(chain, ["a"])
+    calls = [a, balance_call(0, "governance"), balance_call(0, "keeper")]
+    result = Multicall(calls, endpoints=chain.pool, columnar=columnar)()
+
+    assert chain.sizes == [1]
+    assert dict(result.to_dict() if columnar else result) == {
+        "a": 1,
+        "governance": 1,
+        "keeper": 1,
+    }
+
+
+def test_shared_call_failure(chain):
+    (a,) = balances(chain, ["a"])
+    calls = [balance_call(1, "b"), a, balance_call(1, "governance")]
+    multi = Multicall(calls, endpoints=chain.pool, allow_failure=True)
+
+    assert multi() == {"a": 1}
+    assert chain.sizes == [2]
+    assert multi.missing == ["b", "governance"]
+    assert multi.success == [False, True, False]
+
+
+def test_call_without_returns(chain):
+    calls = balances(chain, ["a"])
+    anonymous = Call("0x" + "99" * 20, [func.erc20.balanceOf, USER])
+    chain.set(anonymous, encode_single("uint256", 2))
+    result = Multicall(calls + [anonymous], endpoints=chain.pool, columnar=True)()
+
+    assert result.to_dict() == {"a": 1}
+
+
+def test_plan_changed_in_flight(chain):
+    """
+    A Multicall decodes with the plan as it was compiled when it was built
+    """
+    a, b, c = balances(chain, ["a", "b", "c"])
+    plan = CallPlan().set("a", [a]).set("b", [b])
+    multi = Multicall(plan, endpoints=chain.pool, columnar=True)
+
+    plan.set("c", [c])
+    assert Multicall(plan, endpoints=chain.pool, columnar=True)().names == (
+        "a",
+        "b",
+        "c",
+    )
+
+    result = multi()
+    assert result.names == ("a", "b")
+    assert result.to_dict() == {"a": 1, "b": 2}
+
+
+@pytest.mark.parametrize("allow_failure", [False, True])
+def test_aggregator_without_code(chain, allow_failure):
+    calls = balances(chain, ["a", "b"])
+    chain.aggregators = False
+    multi = Multicall(calls, endpoints=chain.pool, allow_failure=allow_failure)
+
+    with pytest.raises(DecodingError):
+        multi()
+
+
+def test_result_count_checked(chain):
+    multi = Multicall(balances(chain, ["a", "b"]))
+
+    with pytest.raises(DecodingError):
+        multi.unpack(encode_single("(uint256,bytes[])", [1, [b""]]), 2)
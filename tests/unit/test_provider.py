@@ -0,0 +1,44 @@
+import pytest
+import requests
+
+from helpers.provider import Provider, is_read_only
+
+
+def request(method):
+    return {"jsonrpc": "2.0", "id": 1, "method": method, "params": []}
+
+
+@pytest.mark.parametrize(
+    "method, sent",
+    [
+        ("eth_call", 3),
+        ("eth_getBalance", 3),
+        ("evm_mine", 1),
+        ("evm_revert", 1),
+        ("eth_sendTransaction", 1),
+        ("personal_sendTransaction", 1),
+    ],
+)
+def test_only_reads_retried(node, method, sent):
+    server = node(lambda request: "0x0", status=503)
+    provider = Provider(retries=2, backoff=0)
+
+    with pytest.raises(requests.HTTPError):
+        provider.post(server.uri, request(method))
+    assert len(server.requests) == sent
+
+
+def test_batch_with_a_write_not_retried(node):
+    server = node(lambda request: "0x0", status=503)
+    provider = Provider(retries=2, backoff=0)
+
+    with pytest.raises(requests.HTTPError):
+        provider.post(server.uri, [request("eth_call"), request("evm_increaseTime")])
+    assert len(server.requests) == 1
+
+
+def test_is_read_only():
+    assert is_read_only("eth_chainId")
+    assert is_read_only("eth_getTransactionReceipt")
+    assert not is_read_only("eth_getFilterChanges")
+    assert not is_read_only("evm_snapshot")
@@ -0,0 +1,93 @@
+from eth_abi import encode_single
+
+from helpers.multicall import Call, EndpointPool, Multicall, func
+from helpers.multicall.cache import ReadCache
+
+TOKEN = "0x" + "11" * 20
+USER = "0x" + "22" * 20
+
+
+class Fork:
+    """
+    Chain whose block 5 gets mined again, with other contents, after a revert
+    """
+
+    def __init__(self):
+        self.hash = "0x" + "aa" * 32
+        self.balance = 1
+        self.calls = 0
+
+    def answer(self, request):
+        if request["method"] == "eth_chainId":
+            return "0xfa"
+        if request["method"] == "eth_getBlockByNumber":
+            return {"number": request["params"][0], "hash": self.hash}
+        if request["method"] == "eth_call":
+            self.calls += 1
+            return "0x" + encode_single("uint256", self.balance).hex()
+        raise ValueError(request["method"])
+
+
+def balance(pool, cache):
+    call = Call(TOKEN, [func.erc20.balanceOf, USER], [["balance", None]])
+    return call(block_identifier=5, cache=cache, endpoints=pool)["balance"]
+
+
+def test_warm_read_makes_no_request(node):
+    fork = Fork()
+    server = node(fork.answer)
+    pool = EndpointPool([server.uri])
+    cache = ReadCache()
+
+    assert balance(pool, cache) == 1
+    requests = len(server.requests)
+    fork.balance = 2
+    assert balance(pool, cache) == 1
+    assert len(server.requests) == requests
+
+
+def test_reverted_block_read_again(node):
+    fork = Fork()
+    pool = EndpointPool([node(fork.answer).uri])
+    cache = ReadCache()
+    assert balance(pool, cache) == 1
+
+    # chain.revert() to block 4 and block 5 mined again
+    cache._revert(4)
+    fork.hash = "0x" + "bb" * 32
+    fork.balance = 2
+    assert balance(pool, cache) == 2
+    assert fork.calls == 2
+
+    # Reads below the revert height stay cached
+    cache._revert(5)
+    assert balance(pool, cache) == 2
+    assert fork.calls == 2
+
+
+def test_warm_multicall_makes_no_request(chain):
+    calls = [
+        Call("0x" + "{:040x}".format(i + 1), [func.erc20.balanceOf, USER], [[k, None]])
+        for i, k in enumerate(["a", "b"])
+    ]
+    for i, call in enumerate(calls):
+        chain.set(call, encode_single("uint256", i + 1))
+    cache = ReadCache()
+
+    multi = Multicall(calls, block_identifier=100, cache=cache, endpoints=chain.pool)
+    assert multi() == {"a": 1, "b": 2}
+    requests = len(chain.server.requests)
+
+    multi = Multicall(calls, block_identifier=100, cache=cache, endpoints=chain.pool)
+    assert multi() == {"a": 1, "b": 2}
+    assert len(chain.server.requests) == requests
+
+
+def test_latest_not_cached(node):
+    fork = Fork()
+    pool = EndpointPool([node(fork.answer).uri])
+    call = Call(TOKEN, [func.erc20.balanceOf, USER], [["balance", None]])
+
+    call(cache=ReadCache(), endpoints=pool)
+    call(cache=ReadCache(), endpoints=pool)
+    assert fork.calls == 2
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode_single
+
+from helpers import StrategyCoreResolver as core
+from helpers.multicall import Call, func
+from helpers.multicall.multicall import multicall3_address
+
+
+@pytest.mark.parametrize("london", [False, True])
+def test_basefee_probed(chain, monkeypatch, london):
+    monkeypatch.setattr(core, "web3", SimpleNamespace(chain_id=250))
+    if london:
+        basefee = Call(multicall3_address(250), [func.multicall3.getBasefee])
+        chain.set(basefee, encode_single("uint256", 10**9))
+    resolver = core.StrategyCoreResolver(SimpleNamespace(endpoints=chain.pool))
+    resolver.prepare_snap()
+
+    keys = [call.returns[0][0] for call in resolver.add_block_snap([])]
+    assert ("block.basefee" in keys) == london
+    assert len(chain.calls) == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from helpers.multicall import RpcBatch
+
+
+def storage(request):
+    address, slot, _ = request["params"]
+    if address == "0xbad":
+        raise ValueError("execution reverted")
+    return "0x" + "{:064x}".format(int(slot, 16))
+
+
+def test_batch(node):
+    server = node(storage)
+    batch = RpcBatch(server.uri)
+    batch.get_storage_at("a", "0x01", 1).get_storage_at("b", "0x02", 2)
+    result = batch()
+
+    assert len(server.requests) == 1
+    assert int(result["a"].hex(), 16) == 1
+    assert int(result["b"].hex(), 16) == 2
+
+
+def test_failed_request_raises(node):
+    batch = RpcBatch(node(storage).uri)
+    batch.get_storage_at("a", "0x01", 1).get_storage_at("b", "0xbad", 2)
+
+    with pytest.raises(ValueError):
+        batch()
+
+
+def test_allow_failure(node):
+    batch = RpcBatch(node(storage).uri, allow_failure=True)
+    batch.get_storage_at("a", "0x01", 1).get_storage_at("b", "0xbad", 2)
+    result = batch()
+
+    assert list(result) == ["a"]
+    assert batch.errors["b"]["message"] == "execution reverted"
+
+
+def test_batch_answered_with_one_error(node):
+    """
+    Nodes without batch support answer the whole batch with a single error
+    """
+    batch = RpcBatch(node(storage, batches=False).uri)
+    batch.get_storage_at("a", "0x01", 1)
+
+    with pytest.raises(ValueError, match="batch requests not supported"):
+        batch()
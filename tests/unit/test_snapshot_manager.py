@@ -0,0 +1,208 @@
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode_single
+
+from helpers.multicall import Call, func
+from helpers.multicall.address import to_address
+from helpers.snapshot.delta import DELTA, FULL, TRANSFER_TOPIC, VERIFY
+from helpers.snapshot.history import SnapHistory
+from helpers.SnapshotManager import SnapshotManager
+
+WANT = to_address("0x" + "aa" * 20)
+SETT = to_address("0x" + "bb" * 20)
+STRATEGY = to_address("0x" + "cc" * 20)
+USER = to_address("0x" + "01" * 20)
+ZERO = to_address("0x" + "00" * 20)
+
+
+def balance(token, holder, key):
+    return Call(token, [func.erc20.balanceOf, holder], [[key, None]])
+
+
+def topic(address):
+    return "0x" + "00" * 12 + address[2:]
+
+
+class Resolver:
+    """
+    Snaps the want and sett balances of every entity and the sett's price
+    per share, and keeps what it was asked to confirm
+    """
+
+    def __init__(self):
+        self.confirmed = []
+
+    def prepare_snap(self):
+        pass
+
+    def add_block_snap(self, calls):
+        return calls
+
+    def add_sett_snap(self, calls):
+        calls.append(
+            Call(
+                SETT,
+                [func.sett.getPricePerFullShare],
+                [["sett.pricePerFullShare", None]],
+            )
+        )
+        return calls
+
+    def add_strategy_snap(self, calls, entities=None):
+        return calls
+
+    def add_balances_snap(self, calls, entities):
+        for key, entity in entities.items():
+            calls.append(balance(WANT, entity, "balances.want." + key))
+            calls.append(balance(SETT, entity, "balances.sett." + key))
+        return calls
+
+    def confirm_deposit(self, before, after, params):
+        self.confirmed.append(("deposit", before, after))
+
+    def confirm_earn(self, before, after, params):
+        self.confirmed.append(("earn", before, after))
+
+
+class Sett:
+    """
+    Sett on the stand-in chain, every tx mines a block that moves want
+    """
+
+    def __init__(self, chain):
+        self.address = SETT
+        self.chain = chain
+        self.balances = {
+            (WANT, USER): 100,
+            (WANT, SETT): 0,
+            (WANT, STRATEGY): 0,
+            (SETT, USER): 0,
+            (SETT, SETT): 0,
+            (SETT, STRATEGY): 0,
+        }
+        self.chain.set(
+            Call(SETT, [func.sett.getPricePerFullShare], [["ppfs", None]]),
+            encode_single("uint256", 10**18),
+        )
+        self.update()
+
+    def update(self):
+        for (token, holder), amount in self.balances.items():
+            self.chain.set(
+                balance(token, holder, "b"), encode_single("uint256", amount)
+            )
+
+    def mine(self, transfers):
+        self.chain.block += 1
+        self.chain.hash = "0x{:064x}".format(self.chain.block)
+        logs = []
+        for token, sender, receiver, amount in transfers:
+            if sender != ZERO:
+                self.balances[(token, sender)] -= amount
+            self.balances[(token, receiver)] += amount
+            logs.append(
+                {
+                    "address": token,
+                    "topics": [TRANSFER_TOPIC.hex(), topic(sender), topic(receiver)],
+                    "data": "0x" + "{:064x}".format(amount),
+                    "blockHash": self.chain.hash,
+                }
+            )
+        self.update()
+        return SimpleNamespace(block_number=self.chain.block, logs=logs)
+
+    def deposit(self, amount, overrides):
+        return self.mine([(WANT, USER, SETT, amount), (SETT, ZERO, USER, amount)])
+
+    def earn(self, overrides):
+        return self.mine([(WANT, SETT, STRATEGY, self.balances[(WANT, SETT)])])
+
+
+def manager(chain, mode=FULL):
+    """
+    SnapshotManager reading the stand-in chain, built without the contract
+    lookups of its constructor
+    """
+    manager = object.__new__(SnapshotManager)
+    manager.sett = Sett(chain)
+    manager.resolver = Resolver()
+    manager.snaps = SnapHistory()
+    manager.store = None
+    manager.entities = {"sett": SETT, "strategy": STRATEGY}
+    manager.plan = None
+    manager.planEntities = {}
+    manager.nativeEntities = set()
+    manager.endpoints = chain.pool
+    manager.snapMode = mode
+    manager.latestSnap = None
+    manager.coalesce = True
+    return manager
+
+
+@pytest.mark.parametrize("child_block", [False, True])
+def test_earn_reuses_deposit_snap(chain, child_block):
+    chain.child_block = child_block
+    snaps = manager(chain)
+    overrides = {"from": SimpleNamespace(address=USER)}
+
+    snaps.settDeposit(10, overrides)
+    calls = len(chain.calls)
+    snaps.settEarn(overrides)
+
+    (_, before, deposited), (_, earnBefore, earned) = snaps.resolver.confirmed
+    # The earn's before-snap is the deposit's after-snap, not read again
+    assert earnBefore is deposited
+    assert len(chain.calls) == calls + 1
+    assert len(chain.calls) == 3
+    # Labelled with the node's blocks, not the aggregator's
+    assert [before.block, deposited.block, earned.block] == [100, 101, 102]
+    assert deposited.get("balances.want.user") == 90
+    assert earned.get("balances.want.strategy") == 10
+
+
+def test_mined_block_misses(chain):
+    snaps = manager(chain)
+    first = snaps.snap({"user": USER})
+    assert snaps.snap({"user": USER}) is first
+
+    snaps.sett.deposit(10, {})
+    second = snaps.snap({"user": USER})
+    assert second is not first
+    assert second.block == 101
+    assert len(chain.calls) == 2
+
+
+def test_other_entities_miss(chain):
+    snaps = manager(chain)
+    snaps.snap({"user": USER})
+    snaps.snap({"user": STRATEGY})
+
+    assert len(chain.calls) == 2
+
+
+@pytest.mark.parametrize("mode", [DELTA, VERIFY])
+def test_delta_after_snap(chain, capsys, mode):
+    snaps = manager(chain, mode)
+    snaps.settDeposit(10, {"from": SimpleNamespace(address=USER)})
+
+    ((_, before, after),) = snaps.resolver.confirmed
+    # Only the price per share is read, the balances follow from the logs
+    assert chain.sizes == ([7, 1] if mode == DELTA else [7, 1, 7])
+    assert after.block == 101
+    assert after.get("balances.want.user") == 90
+    assert after.get("balances.want.sett") == 10
+    assert after.get("balances.sett.user") == 10
+    assert "Full after-snap" not in capsys.readouterr().out
+
+
+def test_delta_after_gap_reads_everything(chain, capsys):
+    snaps = manager(chain, DELTA)
+    before = snaps.snap({"user": USER})
+    snaps.sett.earn({})
+    tx = snaps.sett.deposit(10, {})
+    after = snaps.snapAfter(before, tx, {"user": USER})
+
+    assert chain.sizes == [7, 7]
+    assert after.get("balances.want.user") == 90
+    assert "Full after-snap" in capsys.readouterr().out
@@ -0,0 +1,116 @@
+import pytest
+
+from helpers.snapshot.history import SnapHistory
+from helpers.snapshot.snap import Snap
+from helpers.snapshot.store import SnapStore
+
+
+def snap(block, balance):
+    return Snap(
+        {"sett.pricePerFullShare": 10**18, "balances.want.user": balance},
+        block,
+        ["user"],
+    )
+
+
+class CountingStore(SnapStore):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.puts = []
+
+    def put(self, snap):
+        self.puts.append(snap.block)
+        super().put(snap)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "snaps.db")
+
+
+def test_setts_at_the_same_block(path):
+    first = SnapStore(path, "native.first")
+    second = SnapStore(path, "native.second")
+    first.put(snap(10, 1))
+    second.put(snap(10, 2))
+    second.put(snap(11, 3))
+
+    assert first.get(10).balances("want", "user") == 1
+    assert second.get(10).balances("want", "user") == 2
+    assert first.blocks() == [10]
+    assert len(second) == 2
+    assert second.series("balances.want.user") == [(10, 2), (11, 3)]
+    assert first.balances("user", "want") == [(10, 1)]
+    assert sorted(first.setts()) == ["native.first", "native.second"]
+    assert 11 not in first
+
+    first.remove(10)
+    assert 10 in second
+
+
+def test_rows(path):
+    store = SnapStore(path, "native.first")
+    store.put(snap(10, 1))
+    store.put(snap(11, 2**200))
+    SnapStore(path, "native.second").put(snap(12, 3))
+
+    assert list(store.rows(["balances.want.user"])) == [
+        ["block", "balances.want.user"],
+        [10, "1"],
+        [11, str(2**200)],
+    ]
+
+
+def test_store_as_spill_written_once(path):
+    store = CountingStore(path, "native.first")
+    history = SnapHistory(maxSnaps=2, spill=store, persisted=True)
+    for block in range(1, 6):
+        # As SnapshotManager.record_snap does
+        history[block] = snap(block, block)
+        store.put(history[block])
+
+    assert store.puts == [1, 2, 3, 4, 5]
+    assert list(history.snaps) == [4, 5]
+    assert history[1].balances("want", "user") == 1
+    assert history.blocks() == [1, 2, 3, 4, 5]
+
+
+def test_snaps_missing_from_store_spilled(path):
+    """
+    Snaps set without a store.put, as load_checkpoint does, are put on eviction
+    """
+    store = CountingStore(path, "native.first")
+    history = SnapHistory(maxSnaps=1, spill=store, persisted=True)
+    history[1] = snap(1, 1)
+    store.put(history[1])
+    for block in (2, 3):
+        history[block] = snap(block, block)
+
+    assert store.puts == [1, 2]
+    assert history[2].balances("want", "user") == 2
+    assert history.blocks() == [1, 2, 3]
+
+
+def test_delete_keeps_persisted_snaps(path):
+    store = SnapStore(path, "native.first")
+    history = SnapHistory(maxSnaps=1, spill=store, persisted=True)
+    for block in (1, 2, 3):
+        history[block] = snap(block, block)
+        store.put(history[block])
+
+    del history[1]
+    assert 1 not in history
+    assert 1 in store
+
+    history.clear()
+    assert len(history) == 0
+    assert store.blocks() == [1, 2, 3]
+
+
+def test_history_only_sees_its_own_snaps(path):
+    store = SnapStore(path, "native.first")
+    store.put(snap(1, 1))
+    history = SnapHistory(maxSnaps=1, spill=store, persisted=True)
+
+    assert 1 not in history
+    assert history.blocks() == []